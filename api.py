@@ -0,0 +1,211 @@
+# API JSON /api/v1 per le entità della dashboard.
+# POST accetta un oggetto o una lista di oggetti: tutte le righe vengono validate
+# e poi inserite con un solo executemany nella stessa transazione; DELETE accetta
+# {"ids": [...]}. Le risposte sono JSON, senza redirect né render della dashboard.
+import io
+import math
+from datetime import datetime
+
+from flask import Blueprint, Response, request, session, jsonify, abort, make_response, stream_with_context
+
+import expenses_io
+import store
+from db import get_db
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+# Righe restituite al massimo da una GET di elenco
+MAX_LIST_LIMIT = 1000
+# Massimo intero di SQLite: oltre non si può passare alla query, e la pagina è
+# comunque vuota
+MAX_LIST_OFFSET = 2 ** 63 - 1
+
+
+def text(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("testo obbligatorio")
+    return value.strip()
+
+
+def optional_text(value):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("deve essere un testo")
+    return value.strip() or None
+
+
+def date(value):
+    return datetime.strptime(text(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def time(value):
+    return datetime.strptime(text(value), '%H:%M').strftime('%H:%M')
+
+
+def quantity(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError("deve essere un intero positivo")
+    return value
+
+
+def amount(value):
+    # Un JSON come 1e309 arriva qui come inf
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise ValueError("deve essere un numero non negativo")
+    return float(value)
+
+
+# Per ogni entità: tabella, campi del JSON (nome, validatore, default) nell'ordine
+# delle colonne dopo user_id, e funzioni di store per inserire e cancellare in blocco
+ENTITIES = {
+    'shopping_list': {
+        'table': 'shopping_list',
+        'fields': [('item', text, None), ('quantity', quantity, 1), ('notes', optional_text, None)],
+        'add': store.add_items,
+        'remove': store.remove_items,
+    },
+    'expenses': {
+        'table': 'expenses',
+        'fields': [('date', date, None), ('description', text, None), ('amount', amount, None),
+                   ('spender', text, None)],
+        'add': store.add_expenses,
+        'remove': store.remove_expenses,
+    },
+    'activities': {
+        'table': 'activities',
+        'fields': [('activity_date', date, None), ('activity_time', time, '00:00'), ('description', text, None),
+                   ('location', text, None), ('activity_type', text, None)],
+        'add': store.add_activities,
+        'remove': store.remove_activities,
+    },
+    'maintenance': {
+        'table': 'bike_maintenance',
+        'fields': [('maintenance_date', date, None), ('description', text, None)],
+        'add': store.add_maintenances,
+        'remove': store.remove_maintenances,
+    },
+    'useful_numbers': {
+        'table': 'useful_numbers',
+        'fields': [('description', text, None), ('phone_number', text, None), ('notes', optional_text, None)],
+        'add': store.add_numbers,
+        'remove': store.remove_numbers,
+    },
+}
+
+
+class InvalidPayload(Exception):
+    pass
+
+
+def parse_rows(entity, payload, user_id):
+    records = payload if isinstance(payload, list) else [payload]
+    if not records:
+        raise InvalidPayload("nessun elemento da inserire")
+    rows = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise InvalidPayload(f"elemento {index}: atteso un oggetto")
+        row = [user_id]
+        for name, validate, default in entity['fields']:
+            value = record.get(name, default)
+            try:
+                row.append(validate(value))
+            except (ValueError, TypeError) as e:
+                raise InvalidPayload(f"elemento {index}, campo '{name}': {e}")
+        rows.append(tuple(row))
+    return rows
+
+
+def parse_ids(payload):
+    ids = payload.get('ids') if isinstance(payload, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise InvalidPayload("atteso {\"ids\": [interi]}")
+    return ids
+
+
+@api_v1.before_request
+def require_login():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+
+
+@api_v1.errorhandler(InvalidPayload)
+def invalid_payload(e):
+    return jsonify(error=str(e)), 400
+
+
+def get_entity(name):
+    entity = ENTITIES.get(name)
+    if entity is None:
+        abort(make_response(jsonify(error=f"Entità sconosciuta '{name}'"), 404))
+    return entity
+
+
+@api_v1.route('/expenses/import', methods=['POST'])
+def import_expenses():
+    # File caricato come multipart "file"; il formato si deduce dall'estensione
+    # o dal campo "format" (csv, json)
+    upload = request.files.get('file')
+    if upload is None:
+        raise InvalidPayload("file mancante (campo 'file')")
+    fmt = request.form.get('format') or expenses_io.detect_format(upload.filename)
+    if fmt not in expenses_io.FORMATS:
+        raise InvalidPayload(f"formato tra {', '.join(expenses_io.FORMATS)}")
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        summary = expenses_io.import_expenses(get_db(), stream, fmt, session.get('user_id'))
+    except expenses_io.ImportFormatError as e:
+        raise InvalidPayload(str(e))
+    return jsonify(summary)
+
+
+@api_v1.route('/expenses/export')
+def export_expenses():
+    fmt = request.args.get('format', 'csv')
+    # Il formato finisce anche nel nome del file di Content-Disposition
+    if fmt not in expenses_io.FORMATS:
+        raise InvalidPayload(f"formato tra {', '.join(expenses_io.FORMATS)}")
+    if fmt == 'json':
+        body, mimetype = expenses_io.export_expenses_json(get_db()), 'application/json'
+    else:
+        body, mimetype = expenses_io.export_expenses_csv(get_db()), 'text/csv'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=spese.{fmt}'})
+
+
+@api_v1.route('/<name>', methods=['GET'])
+def list_entity(name):
+    entity = get_entity(name)
+    # Per SQLite LIMIT -1 vuol dire nessun limite
+    limit = max(min(request.args.get('limit', 100, type=int), MAX_LIST_LIMIT), 1)
+    offset = min(max(request.args.get('offset', 0, type=int), 0), MAX_LIST_OFFSET)
+    with get_db() as conn:
+        rows = store.list_rows(conn.cursor(), entity['table'], limit, offset)
+    return jsonify(rows)
+
+
+@api_v1.route('/<name>', methods=['POST'])
+def create_entity(name):
+    entity = get_entity(name)
+    rows = parse_rows(entity, request.get_json(silent=True), session.get('user_id'))
+    with get_db() as conn:
+        created = entity['add'](conn.cursor(), rows)
+    return jsonify(created=created), 201
+
+
+@api_v1.route('/<name>', methods=['DELETE'])
+def delete_entities(name):
+    entity = get_entity(name)
+    ids = parse_ids(request.get_json(silent=True))
+    with get_db() as conn:
+        deleted = entity['remove'](conn.cursor(), ids)
+    return jsonify(deleted=deleted)
+
+
+@api_v1.route('/<name>/<int:row_id>', methods=['DELETE'])
+def delete_entity(name, row_id):
+    entity = get_entity(name)
+    with get_db() as conn:
+        deleted = entity['remove'](conn.cursor(), [row_id])
+    return jsonify(deleted=deleted)
@@ -1,731 +1,486 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session
-from flask_bcrypt import Bcrypt
+from flask import Flask, current_app, render_template, stream_template, request, redirect, url_for, session, abort, jsonify
+import click
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 import sqlite3
-from collections import defaultdict
-from datetime import datetime, timedelta
+import hashlib
+import json
 import os
-
-app = Flask(__name__)
-app.secret_key = 'una_chiave_segreta_molto_sicura'
-bcrypt = Bcrypt(app)
-
-# Configurazione del database
-DB_NAME = "shopping_list.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    plain_password TEXT NOT NULL,
-                    first_name TEXT NOT NULL DEFAULT '',
-                    last_name TEXT NOT NULL DEFAULT '')''')
-    c.execute('''CREATE TABLE IF NOT EXISTS shopping_list (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    item TEXT NOT NULL,
-                    quantity INTEGER DEFAULT 1,
-                    notes TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(id))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS expenses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    date TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    spender TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS activities (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    activity_date TEXT NOT NULL,
-                    activity_time TEXT NOT NULL DEFAULT '00:00',
-                    description TEXT NOT NULL,
-                    location TEXT NOT NULL,
-                    activity_type TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS activity_types (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    description TEXT NOT NULL UNIQUE,
-                    color TEXT NOT NULL DEFAULT '#000000')''')
-    c.execute('''CREATE TABLE IF NOT EXISTS maintenance_types (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    description TEXT NOT NULL UNIQUE)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS expense_types (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    description TEXT NOT NULL UNIQUE)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS bike_maintenance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    maintenance_date TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS useful_numbers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    description TEXT NOT NULL,
-                    phone_number TEXT NOT NULL,
-                    notes TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(id))''')
-    default_expense_types = [("Cibo",), ("Trasporti",), ("Bollette",), ("Svago",), ("Altro",)]
-    c.executemany("INSERT OR IGNORE INTO expense_types (description) VALUES (?)", default_expense_types)
-    conn.commit()
-    conn.close()
-
-def migrate_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Controlla se la colonna 'notes' esiste nella tabella shopping_list
-    c.execute("PRAGMA table_info(shopping_list)")
-    columns = [col[1] for col in c.fetchall()]
-    if 'notes' not in columns:
-        print("Aggiungo la colonna 'notes' alla tabella shopping_list...")
-        c.execute("ALTER TABLE shopping_list ADD COLUMN notes TEXT")
-        conn.commit()
-        print("Colonna 'notes' aggiunta con successo.")
-    else:
-        print("La colonna 'notes' esiste già nella tabella shopping_list.")
-    conn.close()
-
-# Template HTML con CSS e JavaScript
-template = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Lista della Spesa</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: 'Segoe UI', sans-serif; background: #f0f2f5; color: #333; }
-        h1 { font-size: 24px; margin-bottom: 20px; }
-        h2 { font-size: 20px; margin-bottom: 15px; }
-        .container { max-width: 100%; padding: 20px; }
-        .form-container { margin-bottom: 20px; }
-        input[type="text"], input[type="password"], input[type="number"], input[type="date"], input[type="time"], input[type="color"] { 
-            width: 100%; padding: 12px; margin: 8px 0; border: 1px solid #ddd; border-radius: 8px; font-size: 16px; }
-        input[type="number"] { width: 80px; }
-        input[type="time"] { width: 120px; }
-        input[type="color"] { height: 40px; padding: 0; }
-        select { width: 100%; padding: 12px; margin: 8px 0; border: 1px solid #ddd; border-radius: 8px; font-size: 16px; }
-        button { 
-            width: 100%; padding: 12px; border: none; border-radius: 8px; color: white; font-size: 16px; cursor: pointer; 
-            transition: transform 0.2s, background-color 0.2s; }
-        button:hover { transform: scale(1.02); }
-        .menu { display: flex; flex-direction: column; gap: 10px; }
-        .menu-btn-1 { background: #28a745; }
-        .menu-btn-1:hover { background: #218838; }
-        .menu-btn-2 { background: #007bff; }
-        .menu-btn-2:hover { background: #0069d9; }
-        .menu-btn-3 { background: #ff9800; }
-        .menu-btn-3:hover { background: #e68a00; }
-        .menu-btn-4 { background: #6f42c1; }
-        .menu-btn-4:hover { background: #5e35b1; }
-        .menu-btn-5 { background: #17a2b8; }
-        .menu-btn-5:hover { background: #138496; }
-        .menu-btn-6 { background: #dc3545; }
-        .menu-btn-6:hover { background: #c82333; }
-        .menu-btn-7 { background: #ffc107; }
-        .menu-btn-7:hover { background: #e0a800; }
-        .remove-btn { background: #dc3545; width: auto; padding: 8px 16px; }
-        .remove-btn:hover { background: #c82333; }
-        .link-btn { background: #007bff; width: auto; padding: 10px 20px; }
-        .link-btn:hover { background: #0069d9; }
-        .back-btn { background: #6c757d; margin-top: 20px; }
-        .back-btn:hover { background: #5a6268; }
-        .settings-btn, .calendar-btn { background: none; border: none; font-size: 24px; cursor: pointer; margin-right: 10px; }
-        .item, .expense-item, .activity-item, .maintenance-item, .number-item { 
-            background: white; padding: 15px; margin: 10px 0; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); 
-            display: flex; justify-content: space-between; align-items: center; }
-        .item-content { display: flex; justify-content: space-between; width: 100%; flex-wrap: wrap; }
-        .item-description { flex-grow: 1; }
-        .item-quantity { margin-left: 10px; color: #555; }
-        .item-notes { margin-left: 10px; color: #777; font-style: italic; }
-        .expense-item span, .activity-item span, .maintenance-item span, .number-item span { flex-grow: 1; }
-        .color-box { display: inline-block; width: 20px; height: 20px; margin-left: 10px; vertical-align: middle; }
-        .empty { color: #777; font-style: italic; text-align: center; }
-        .error { color: #dc3545; margin-top: 10px; text-align: center; }
-        .header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; }
-        .header-right { display: flex; align-items: center; }
-        .content { display: none; margin-top: 20px; }
-        .content.active { display: block; }
-        .subcontent { display: none; }
-        .subcontent.active { display: block; }
-        table { width: 100%; border-collapse: collapse; margin-top: 10px; }
-        th, td { padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }
-        th { background: #e9ecef; }
-        canvas { max-width: 100%; margin-top: 20px; }
-        .calendar { display: none; margin-top: 20px; }
-        .calendar.active { display: block; }
-        .calendar-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px; }
-        .calendar-days { display: grid; grid-template-columns: repeat(7, 1fr); gap: 5px; }
-        .calendar-day { background: white; padding: 10px; border-radius: 8px; text-align: center; cursor: pointer; }
-        .calendar-day:hover { background: #e9ecef; }
-        .activity-dot { width: 10px; height: 10px; border-radius: 50%; display: inline-block; margin: 2px; }
-        .logo { display: block; margin: 20px auto; max-width: 200px; }
-        @media (min-width: 768px) {
-            .container { max-width: 600px; margin: 0 auto; }
-            .menu { max-width: 300px; }
-        }
-    </style>
-    <script>
-        function showSection(sectionId) {
-            document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
-            document.getElementById(sectionId).classList.add('active');
-            document.querySelector('.menu').style.display = 'none';
-            document.querySelector('.header').style.display = 'none';
-            localStorage.setItem('activeSection', sectionId);
-            if (sectionId === 'expense-report') {
-                showSubSection(document.getElementById('expense-options').value);
-            }
-        }
-        function showMenu() {
-            document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
-            document.querySelector('.menu').style.display = 'flex';
-            document.querySelector('.header').style.display = 'flex';
-            localStorage.removeItem('activeSection');
-        }
-        function showSettings() {
-            document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
-            document.querySelector('.menu').style.display = 'none';
-            document.querySelector('.header').style.display = 'none';
-            document.getElementById('settings').classList.add('active');
-            localStorage.setItem('activeSection', 'settings');
-        }
-        function showSubSection(subSectionId) {
-            document.querySelectorAll('.subcontent').forEach(content => content.classList.remove('active'));
-            document.getElementById(subSectionId).classList.add('active');
-            localStorage.setItem('activeSubSection', subSectionId);
-        }
-        window.onload = function() {
-            const urlParams = new URLSearchParams(window.location.search);
-            const section = urlParams.get('section') || localStorage.getItem('activeSection');
-            if (section) {
-                if (section === 'settings') {
-                    showSettings();
-                } else {
-                    showSection(section);
-                }
-            } else {
-                document.querySelector('.menu').style.display = 'flex';
-                document.querySelector('.header').style.display = 'flex';
-            }
-        }
-        function updateSubSection() {
-            const selected = document.getElementById('expense-options').value;
-            showSubSection(selected);
-        }
-        function toggleCalendar() {
-            const calendar = document.getElementById('weekly-calendar');
-            calendar.classList.toggle('active');
-        }
-        function changeWeek(offset) {
-            const currentWeekStart = new Date(document.getElementById('week-start').value);
-            currentWeekStart.setDate(currentWeekStart.getDate() + (offset * 7));
-            document.getElementById('week-start').value = currentWeekStart.toISOString().split('T')[0];
-            updateCalendar();
-        }
-        function updateCalendar() {
-            const weekStart = new Date(document.getElementById('week-start').value);
-            const days = document.querySelectorAll('.calendar-day');
-            const activities = JSON.parse(document.getElementById('activities-data').textContent);
-            const activityTypes = JSON.parse(document.getElementById('activity-types-data').textContent);
-            const typeColorMap = {};
-            activityTypes.forEach(type => typeColorMap[type[1]] = type[2]);
-
-            days.forEach((day, index) => {
-                const date = new Date(weekStart);
-                date.setDate(weekStart.getDate() + index);
-                const dateStr = date.toISOString().split('T')[0];
-                day.dataset.date = dateStr;
-                day.innerHTML = date.getDate();
-
-                const dayActivities = activities.filter(act => act[2] === dateStr);
-                if (dayActivities.length > 0) {
-                    const dots = dayActivities.map(act => {
-                        const color = typeColorMap[act[6]] || '#000000';
-                        return `<span class="activity-dot" style="background-color: ${color};" title="${act[4]} - ${act[5]} (${act[6]})"></span>`;
-                    }).join('');
-                    day.innerHTML += '<br>' + dots;
-                }
-            });
-        }
-        function showDayActivities(date) {
-            const activities = JSON.parse(document.getElementById('activities-data').textContent);
-            const dayActivities = activities.filter(act => act[2] === date);
-            const activityList = document.getElementById('day-activities-list');
-            activityList.innerHTML = '';
-            if (dayActivities.length > 0) {
-                dayActivities.forEach(act => {
-                    const li = document.createElement('li');
-                    li.textContent = `${act[3]} - ${act[4]} - ${act[5]} (${act[2]} ${act[3]})`;
-                    activityList.appendChild(li);
-                });
-            } else {
-                activityList.innerHTML = '<p class="empty">Nessuna attività per questo giorno.</p>';
-            }
-            document.getElementById('day-activities').classList.add('active');
-        }
-        function closeDayActivities() {
-            document.getElementById('day-activities').classList.remove('active');
-        }
-    </script>
-</head>
-<body>
-    <div class="container">
-        {% if not session.get('logged_in') %}
-            {% if request.path == '/register' %}
-                <h1>Iscriviti</h1>
-                <form method="POST" action="/register">
-                    <div class="form-container">
-                        <input type="text" name="first_name" placeholder="Nome" required>
-                        <input type="text" name="last_name" placeholder="Cognome" required>
-                        <input type="text" name="username" placeholder="Nome utente" required>
-                        <input type="password" name="password" placeholder="Password" required>
-                        <button type="submit" style="background: #28a745;">Registrati</button>
-                    </div>
-                    {% if error %}
-                        <p class="error">{{ error }}</p>
-                    {% endif %}
-                    <a href="{{ url_for('home') }}"><button type="button" class="link-btn">Torna al Login</button></a>
-                    <img src="{{ url_for('static', filename='logo.png') }}" alt="Tati Adventure Logo" class="logo">
-                </form>
-            {% else %}
-                <h1>Login</h1>
-                <form method="POST" action="/login">
-                    <div class="form-container">
-                        <input type="text" name="username" placeholder="Nome utente" required>
-                        <input type="password" name="password" placeholder="Password" required>
-                        <button type="submit" style="background: #28a745;">Accedi</button>
-                    </div>
-                    {% if error %}
-                        <p class="error">{{ error }}</p>
-                    {% endif %}
-                    <a href="{{ url_for('register') }}"><button type="button" class="link-btn">Iscriviti</button></a>
-                    <img src="{{ url_for('static', filename='logo.png') }}" alt="Tati Adventure Logo" class="logo">
-                </form>
-            {% endif %}
-        {% else %}
-            <div class="header">
-                <h1>Benvenuto, {{ session['first_name'] }} {{ session['last_name'] }}!</h1>
-                <div class="header-right">
-                    <button class="settings-btn" onclick="showSettings()">⚙️</button>
-                    <a href="{{ url_for('logout') }}"><button style="background: #dc3545; width: auto;">Logout</button></a>
-                </div>
-            </div>
-            
-            <div class="menu">
-                <button class="menu-btn-1" onclick="showSection('shopping-list')">Lista della Spesa</button>
-                <button class="menu-btn-2" onclick="showSection('expense-report')">Rendicontazione Spese</button>
-                <button class="menu-btn-3" onclick="showSection('task-planner')">Programmazione Attività</button>
-                <button class="menu-btn-4" onclick="showSection('bike-maintenance')">Manutenzione Bicicletta</button>
-                <button class="menu-btn-5" onclick="showSection('useful-numbers')">Numeri Utili</button>
-                <button class="menu-btn-6" onclick="showSection('oscar-schedule')">Turnazione Oscar</button>
-                <button class="menu-btn-7" onclick="showSection('notes')">Note</button>
-                <img src="{{ url_for('static', filename='logo.png') }}" alt="Tati Adventure Logo" class="logo">
-            </div>
-            
-            <div id="settings" class="content">
-                <h2>Impostazioni</h2>
-                <div class="menu">
-                    <button class="menu-btn-2" onclick="showSection('activity-management')">Gestione Attività</button>
-                    <button class="menu-btn-3" onclick="showSection('maintenance-types')">Tipi di Manutenzione</button>
-                    <button class="menu-btn-1" onclick="showSection('expense-types')">Tipologia Spese</button>
-                </div>
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="activity-management" class="content">
-                <h2>Gestione Attività</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_activity_type">
-                        <input type="text" name="description" placeholder="Descrizione Attività" required>
-                        <input type="color" name="color" value="#000000" title="Seleziona Colore">
-                        <button type="submit" style="background: #007bff;">Aggiungi Tipo Attività</button>
-                    </form>
-                </div>
-                {% if activity_types %}
-                    {% for activity_type in activity_types %}
-                        <div class="activity-item">
-                            <span>{{ activity_type[1] }} <span class="color-box" style="background-color: {{ activity_type[2] }};"></span></span>
-                            <a href="{{ url_for('remove_activity_type', type_id=activity_type[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">Nessun tipo di attività registrato.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="maintenance-types" class="content">
-                <h2>Tipi di Manutenzione</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_maintenance_type">
-                        <input type="text" name="description" placeholder="Descrizione Tipo di Manutenzione" required>
-                        <button type="submit" style="background: #ff9800;">Aggiungi Tipo di Manutenzione</button>
-                    </form>
-                </div>
-                {% if maintenance_types %}
-                    {% for maintenance_type in maintenance_types %}
-                        <div class="activity-item">
-                            <span>{{ maintenance_type[1] }}</span>
-                            <a href="{{ url_for('remove_maintenance_type', type_id=maintenance_type[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">Nessun tipo di manutenzione registrato.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="expense-types" class="content">
-                <h2>Tipologia Spese</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_expense_type">
-                        <input type="text" name="description" placeholder="Descrizione Tipo di Spesa" required>
-                        <button type="submit" style="background: #28a745;">Aggiungi Tipo di Spesa</button>
-                    </form>
-                </div>
-                {% if expense_types %}
-                    {% for expense_type in expense_types %}
-                        <div class="activity-item">
-                            <span>{{ expense_type[1] }}</span>
-                            <a href="{{ url_for('remove_expense_type', type_id=expense_type[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">Nessun tipo di spesa registrato.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="shopping-list" class="content">
-                <h2>Lista della Spesa</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add">
-                        <input type="text" name="item" placeholder="Aggiungi un articolo" required>
-                        <input type="number" name="quantity" value="1" min="1" placeholder="Quantità">
-                        <input type="text" name="notes" placeholder="Note (opzionale)">
-                        <button type="submit" style="background: #28a745;">Aggiungi</button>
-                    </form>
-                </div>
-                {% if items %}
-                    {% for item in items %}
-                        <div class="item">
-                            <div class="item-content">
-                                <span class="item-description">{{ item[1] }}</span>
-                                <span class="item-quantity">({{ item[2] }})</span>
-                                {% if item[3] %}
-                                    <span class="item-notes">{{ item[3] }}</span>
-                                {% endif %}
-                            </div>
-                            <a href="{{ url_for('remove_item', item_id=item[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">La lista è vuota! Aggiungi qualcosa da acquistare.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="expense-report" class="content">
-                <h2>Rendicontazione Spese</h2>
-                <select id="expense-options" onchange="updateSubSection()">
-                    <option value="add-expense">Aggiungi Spesa</option>
-                    <option value="monthly-totals">Spese Totali Mensili</option>
-                    <option value="yearly-by-description">Spese per Descrizione (Annue)</option>
-                    <option value="expense-chart">Grafico Spese Mensili</option>
-                </select>
-                
-                <div id="add-expense" class="subcontent">
-                    <div class="form-container">
-                        <form method="POST" action="/add_expense">
-                            <input type="date" name="date" required>
-                            <select name="description" required>
-                                {% for expense_type in expense_types %}
-                                    <option value="{{ expense_type[1] }}">{{ expense_type[1] }}</option>
-                                {% endfor %}
-                            </select>
-                            <input type="number" name="amount" step="0.01" min="0" placeholder="Importo (€)" required>
-                            <input type="text" name="spender" value="{{ session['first_name'] }} {{ session['last_name'] }}" placeholder="Chi ha speso" required>
-                            <button type="submit" style="background: #007bff;">Aggiungi Spesa</button>
-                        </form>
-                    </div>
-                    {% if expenses %}
-                        {% for expense in expenses %}
-                            <div class="expense-item">
-                                <span>{{ expense[2] }} - {{ expense[3] }} - €{{ "%.2f"|format(expense[4]) }} ({{ expense[5] }})</span>
-                                <a href="{{ url_for('remove_expense', expense_id=expense[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                            </div>
-                        {% endfor %}
-                    {% else %}
-                        <p class="empty">Nessuna spesa registrata.</p>
-                    {% endif %}
-                </div>
-                
-                <div id="monthly-totals" class="subcontent">
-                    <h3>Spese Totali Mensili</h3>
-                    {% if monthly_totals %}
-                        <table>
-                            <tr><th>Mese</th><th>Totale (€)</th></tr>
-                            {% for month, total in monthly_totals.items() %}
-                                <tr><td>{{ month }}</td><td>{{ "%.2f"|format(total) }}</td></tr>
-                            {% endfor %}
-                        </table>
-                    {% else %}
-                        <p class="empty">Nessun dato disponibile.</p>
-                    {% endif %}
-                </div>
-                
-                <div id="yearly-by-description" class="subcontent">
-                    <h3>Spese Totali per Descrizione (Annue)</h3>
-                    {% if yearly_by_description %}
-                        <table>
-                            <tr><th>Descrizione</th><th>Totale (€)</th></tr>
-                            {% for desc, total in yearly_by_description.items() %}
-                                <tr><td>{{ desc }}</td><td>{{ "%.2f"|format(total) }}</td></tr>
-                            {% endfor %}
-                        </table>
-                    {% else %}
-                        <p class="empty">Nessun dato disponibile.</p>
-                    {% endif %}
-                </div>
-                
-                <div id="expense-chart" class="subcontent">
-                    <h3>Grafico Spese Mensili (Ultimo Anno)</h3>
-                    {% if monthly_totals %}
-                        <canvas id="expenseChart"></canvas>
-                        <script>
-                            const ctx = document.getElementById('expenseChart').getContext('2d');
-                            const chartData = {
-                                labels: [{% for month in monthly_totals.keys() %}'{{ month }}',{% endfor %}],
-                                datasets: [{
-                                    label: 'Spese Mensili (€)',
-                                    data: [{% for total in monthly_totals.values() %}{{ total }},{% endfor %}],
-                                    backgroundColor: 'rgba(0, 123, 255, 0.5)',
-                                    borderColor: 'rgba(0, 123, 255, 1)',
-                                    borderWidth: 1
-                                }]
-                            };
-                            new Chart(ctx, {
-                                type: 'bar',
-                                data: chartData,
-                                options: {
-                                    scales: {
-                                        y: { beginAtZero: true }
-                                    }
-                                }
-                            });
-                        </script>
-                    {% else %}
-                        <p class="empty">Nessun dato disponibile per il grafico.</p>
-                    {% endif %}
-                </div>
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="task-planner" class="content">
-                <h2>Programmazione Attività</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_activity">
-                        <input type="date" name="activity_date" required>
-                        <input type="time" name="activity_time" required>
-                        <input type="text" name="description" placeholder="Descrizione Attività" required>
-                        <input type="text" name="location" placeholder="Luogo Attività" required>
-                        <select name="activity_type" required>
-                            {% for activity_type in activity_types %}
-                                <option value="{{ activity_type[1] }}">{{ activity_type[1] }}</option>
-                            {% endfor %}
-                        </select>
-                        <button type="submit" style="background: #ff9800;">Aggiungi Attività</button>
-                    </form>
-                </div>
-                <button class="calendar-btn" onclick="toggleCalendar()">📅</button>
-                <div id="weekly-calendar" class="calendar">
-                    <div class="calendar-header">
-                        <button onclick="changeWeek(-1)">◄</button>
-                        <input type="date" id="week-start" value="{{ today }}" onchange="updateCalendar()" style="width: auto;">
-                        <button onclick="changeWeek(1)">►</button>
-                    </div>
-                    <div class="calendar-days">
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                        <div class="calendar-day" onclick="showDayActivities(this.dataset.date)"></div>
-                    </div>
-                </div>
-                <div id="day-activities" class="calendar" style="display: none;">
-                    <h3>Attività del Giorno</h3>
-                    <ul id="day-activities-list"></ul>
-                    <button class="back-btn" onclick="closeDayActivities()">Chiudi</button>
-                </div>
-                <script id="activities-data" type="application/json">{{ activities | tojson }}</script>
-                <script id="activity-types-data" type="application/json">{{ activity_types | tojson }}</script>
-                <script>updateCalendar();</script>
-                {% if activities %}
-                    {% for activity in activities %}
-                        <div class="activity-item">
-                            <span>{{ activity[2] }} {{ activity[3] }} - {{ activity[4] }} - {{ activity[5] }} ({{ activity[6] }})</span>
-                            <a href="{{ url_for('remove_activity', activity_id=activity[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">Nessuna attività programmata.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="bike-maintenance" class="content">
-                <h2>Manutenzione Bicicletta</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_maintenance">
-                        <input type="date" name="maintenance_date" required>
-                        <select name="description" required>
-                            {% for maintenance_type in maintenance_types %}
-                                <option value="{{ maintenance_type[1] }}">{{ maintenance_type[1] }}</option>
-                            {% endfor %}
-                        </select>
-                        <button type="submit" style="background: #6f42c1;">Aggiungi Manutenzione</button>
-                    </form>
-                </div>
-                {% if maintenances %}
-                    {% for maintenance in maintenances %}
-                        <div class="maintenance-item">
-                            <span>{{ maintenance[2] }} - {{ maintenance[3] }}</span>
-                            <a href="{{ url_for('remove_maintenance', maintenance_id=maintenance[0]) }}"><button class="remove-btn">Rimuovi</button></a>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <p class="empty">Nessuna manutenzione registrata.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="useful-numbers" class="content">
-                <h2>Numeri Utili</h2>
-                <div class="form-container">
-                    <form method="POST" action="/add_number">
-                        <input type="text" name="description" placeholder="Descrizione" required>
-                        <input type="text" name="phone_number" placeholder="Numero di telefono" required>
-                        <input type="text" name="notes" placeholder="Note">
-                        <button type="submit" style="background: #17a2b8;">Aggiungi Numero</button>
-                    </form>
-                </div>
-                {% if numbers %}
-                    <table>
-                        <tr><th>Descrizione</th><th>Numero</th><th>Note</th><th>Azione</th></tr>
-                        {% for number in numbers %}
-                            <tr>
-                                <td>{{ number[2] }}</td>
-                                <td>{{ number[3] }}</td>
-                                <td>{{ number[4] or '' }}</td>
-                                <td><a href="{{ url_for('remove_number', number_id=number[0]) }}"><button class="remove-btn">Rimuovi</button></a></td>
-                            </tr>
-                        {% endfor %}
-                    </table>
-                {% else %}
-                    <p class="empty">Nessun numero utile registrato.</p>
-                {% endif %}
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="oscar-schedule" class="content">
-                <h2>Turnazione Oscar</h2>
-                <p>Funzionalità in sviluppo...</p>
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-            
-            <div id="notes" class="content">
-                <h2>Note</h2>
-                <p>Funzionalità in sviluppo...</p>
-                <button class="back-btn" onclick="showMenu()">Torna al Menu</button>
-            </div>
-        {% endif %}
-    </div>
-</body>
-</html>
-'''
-
-# Inizializza o aggiorna il database all'avvio
-init_db()
-migrate_db()  # Esegui la migrazione per aggiungere la colonna 'notes'
-
-@app.route('/')
+import re
+from datetime import date, datetime, timedelta, timezone
+
+import assets
+import cache
+import db
+import events
+import expenses_io
+import households
+import metrics
+import passwords
+import profiling
+import schema
+import store
+from api import api_v1
+from db import get_db
+
+# Route e comandi vengono raccolti all'import e registrati da create_app():
+# importare il modulo non apre il database e non compila i template
+ROUTES = []
+COMMANDS = []
+
+def route(rule, **options):
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+def command(name):
+    def decorator(fn):
+        cli_command = click.command(name)(fn)
+        COMMANDS.append(cli_command)
+        return cli_command
+    return decorator
+
+def household_db(household):
+    # File della famiglia indicata con --household; senza, quello della predefinita
+    name = households.db_name(household)
+    if name is None:
+        raise click.BadParameter(f"la famiglia {household} non esiste", param_hint='--household')
+    return name
+
+@command('migrate-db')
+def migrate_db_command():
+    """Applica le migrazioni mancanti ai database di tutte le famiglie."""
+    schema.migrate_db(db.DB_NAME)
+    households.create_directory()
+    for db_name in households.all_db_names():
+        schema.migrate_db(db_name)
+    print(f"Schema alla versione {schema.LATEST_VERSION}.")
+
+@command('create-household')
+@click.argument('name')
+@click.option('--db', 'path', help="File SQLite della famiglia (di default nella cartella HOUSEHOLDS_DIR).")
+def create_household_command(name, path):
+    """Crea una famiglia con il proprio database."""
+    household_id = households.create_household(name, path)
+    print(f"Famiglia {household_id}: {households.db_name(household_id)}")
+
+@command('add-member')
+@click.argument('username')
+@click.argument('household', type=int)
+def add_member_command(username, household):
+    """Sposta un utente registrato nella famiglia indicata."""
+    try:
+        households.move_member(username, household)
+    except (LookupError, ValueError) as e:
+        raise click.ClickException(str(e))
+    print(f"{username} ora fa parte della famiglia {household}; le sue sessioni aperte restano "
+          "sulla famiglia precedente fino al prossimo accesso.")
+
+@command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Genera in static/dist i file statici con impronta e le varianti compresse."""
+    manifest = assets.build(current_app.static_folder)
+    for name, hashed in manifest['files'].items():
+        print(f"{name} -> {hashed}")
+
+@command('import-expenses')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(expenses_io.FORMATS), help="Formato del file (di default dall'estensione).")
+@click.option('--user-id', type=int, help="Utente a cui attribuire le spese importate.")
+@click.option('--household', type=int, help="Famiglia di destinazione (di default la predefinita).")
+def import_expenses_command(path, fmt, user_id, household):
+    """Importa spese da un file CSV o JSON a blocchi."""
+    conn = get_db(household_db(household))
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        summary = expenses_io.import_expenses(conn, stream, fmt or expenses_io.detect_format(path), user_id)
+    for error in summary['errors']:
+        print(error)
+    print(f"Importate {summary['imported']} spese, scartate {summary['rejected']}.")
+
+@command('export-expenses')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(expenses_io.FORMATS), help="Formato del file (di default dall'estensione).")
+@click.option('--household', type=int, help="Famiglia da esportare (di default la predefinita).")
+def export_expenses_command(path, fmt, household):
+    """Esporta tutte le spese in un file CSV o JSON."""
+    fmt = fmt or expenses_io.detect_format(path)
+    export = expenses_io.export_expenses_json if fmt == 'json' else expenses_io.export_expenses_csv
+    conn = get_db(household_db(household))
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        for part in export(conn):
+            out.write(part)
+
+@command('check-query-plans')
+def check_query_plans_command():
+    """Verifica con EXPLAIN QUERY PLAN che le query principali usino gli indici."""
+    failures = schema.check_query_plans(db.DB_NAME)
+    for name, index, plan in failures:
+        print(f"{name}: atteso {index}, piano: {plan}")
+    if failures:
+        raise SystemExit(1)
+    print(f"{len(schema.HOT_QUERIES)} query controllate, tutte usano l'indice atteso.")
+
+@command('compact-changes')
+@click.option('--days', type=int, default=30, show_default=True, help="Giorni di modifiche da conservare.")
+def compact_changes_command(days):
+    """Compatta il registro delle modifiche di tutte le famiglie."""
+    before = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%S')
+    for db_name in households.all_db_names():
+        with get_db(db_name) as conn:
+            superseded, expired = store.compact_changes(conn.cursor(), before)
+        print(f"{db_name}: {superseded} modifiche superate e {expired} più vecchie di {days} giorni rimosse.")
+
+# Sezioni della dashboard: id nel DOM, template, loader dei dati (None se statica)
+# e tabelle da cui dipende il contenuto (per le versioni usate negli ETag).
+# In modalità lazy la prima risposta contiene il menu e solo la sezione attiva,
+# le altre vengono richieste a /section/<id> quando l'utente le apre.
+SECTIONS = [
+    ('settings', 'sections/settings.html', None, ()),
+    ('activity-management', 'sections/activity_management.html', store.load_activity_types,
+     ('activity_types',)),
+    ('maintenance-types', 'sections/maintenance_types.html', store.load_maintenance_types,
+     ('maintenance_types',)),
+    ('expense-types', 'sections/expense_types.html', store.load_expense_types, ('expense_types',)),
+    ('shopping-list', 'sections/shopping_list.html', store.load_shopping_list, ('shopping_list',)),
+    ('expense-report', 'sections/expense_report.html',
+     lambda c: store.load_expense_report(c, page=request.args.get('expenses_page', type=int)),
+     ('expenses', 'expense_types')),
+    ('task-planner', 'sections/task_planner.html',
+     lambda c: store.load_task_planner(c, page=request.args.get('activities_page', type=int)),
+     ('activities', 'activity_types')),
+    ('bike-maintenance', 'sections/bike_maintenance.html', store.load_bike_maintenance,
+     ('bike_maintenance', 'maintenance_types')),
+    ('useful-numbers', 'sections/useful_numbers.html', store.load_useful_numbers, ('useful_numbers',)),
+    ('oscar-schedule', 'sections/oscar_schedule.html', None, ()),
+    ('notes', 'sections/notes.html', None, ()),
+]
+SECTIONS_BY_ID = {section[0]: section[1:] for section in SECTIONS}
+
+# Sezioni il cui HTML dipende solo dalle loro tabelle (non dall'utente, dalla data
+# o dai parametri): il frammento renderizzato si riusa finché le versioni non cambiano
+CACHED_SECTIONS = {'settings', 'activity-management', 'maintenance-types', 'expense-types',
+                   'shopping-list', 'bike-maintenance', 'useful-numbers', 'oscar-schedule', 'notes'}
+# Dimensione massima impostata da create_app() con FRAGMENT_CACHE_MAX_BYTES
+section_cache = cache.register('sections', 8 * 1024 * 1024)
+
+def section_versions(c, section_ids):
+    # Versioni delle tabelle usate dalle sezioni: una query su data_versions
+    tables = sorted({table for section_id in section_ids for table in SECTIONS_BY_ID[section_id][2]})
+    return dict(zip(tables, store.get_versions(c, *tables))) if tables else {}
+
+def render_section(c, section_id, versions):
+    template_name, loader, tables = SECTIONS_BY_ID[section_id]
+    if section_id not in CACHED_SECTIONS:
+        return Markup(render_template(template_name, **(loader(c) if loader else {})))
+    key = (db.current_db(), section_id, tuple(versions[table] for table in tables))
+    html = section_cache.get(key)
+    if html is None:
+        html = render_template(template_name, **(loader(c) if loader else {}))
+        section_cache.put(key, html, group=key[:2])
+    return Markup(html)
+
+def conditional_render(section_ids, render):
+    # L'ETag dipende solo dalle versioni delle tabelle usate dalle sezioni, non dai
+    # dati: se il browser ha già questa versione si risponde 304 senza caricare nulla
+    with get_db() as conn:
+        c = conn.cursor()
+        versions = section_versions(c, section_ids)
+        key = (current_app.config['TEMPLATES_FINGERPRINT'], schema.LATEST_VERSION,
+               current_app.config['LAZY_SECTIONS'], db.current_db(),
+               session.get('user_id'), session.get('first_name'), session.get('last_name'),
+               datetime.now().strftime('%Y-%m-%d'), request.full_path, sorted(versions.items()))
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(render(c, versions))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+# Segnaposto nei template per lo streaming: ciò che precede viene inviato subito
+STREAM_FLUSH = '<!-- flush -->'
+
+class LazyFragments:
+    # Frammenti delle sezioni renderizzati solo quando il template li raggiunge
+    def __init__(self, c, section_ids, versions):
+        self.c = c
+        self.section_ids = section_ids
+        self.versions = versions
+
+    def __contains__(self, section_id):
+        return section_id in self.section_ids
+
+    def __getitem__(self, section_id):
+        return render_section(self.c, section_id, self.versions)
+
+def flush_at_markers(chunks):
+    # Jinja produce tanti piccoli pezzi: si raggruppano e si inviano a ogni STREAM_FLUSH
+    buffer = []
+    for chunk in chunks:
+        parts = chunk.split(STREAM_FLUSH)
+        for part in parts[:-1]:
+            buffer.append(part)
+            yield ''.join(buffer)
+            buffer = []
+        buffer.append(parts[-1])
+    yield ''.join(buffer)
+
+@route('/')
 def home():
     if not session.get('logged_in'):
-        return render_template_string(template, error=None)
-    user_id = session.get('user_id')
-    today = datetime.now().strftime('%Y-%m-%d')
-    with sqlite3.connect(DB_NAME) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, item, quantity, notes FROM shopping_list")
-        items = c.fetchall()
-        c.execute("SELECT id, user_id, date, description, amount, spender FROM expenses")
-        expenses = c.fetchall()
-        c.execute("SELECT id, user_id, activity_date, activity_time, description, location, activity_type FROM activities")
-        activities = c.fetchall()
-        c.execute("SELECT id, description, color FROM activity_types")
-        activity_types = c.fetchall()
-        c.execute("SELECT id, description FROM maintenance_types ORDER BY description ASC")
-        maintenance_types = c.fetchall()
-        c.execute("SELECT id, description FROM expense_types")
-        expense_types = c.fetchall()
-        c.execute("SELECT id, user_id, maintenance_date, description FROM bike_maintenance")
-        maintenances = c.fetchall()
-        c.execute("SELECT id, user_id, description, phone_number, notes FROM useful_numbers ORDER BY description ASC")
-        numbers = c.fetchall()
-
-    monthly_totals = defaultdict(float)
-    yearly_by_description = defaultdict(float)
-    current_year = datetime.now().year
-
-    for expense in expenses:
-        date = datetime.strptime(expense[2], '%Y-%m-%d')
-        month_key = date.strftime('%Y-%m')
-        yearly_key = date.year
-        monthly_totals[month_key] += float(expense[4])
-        if yearly_key == current_year:
-            yearly_by_description[expense[3]] += float(expense[4])
-
+        return render_template('login.html', error=None)
     section = request.args.get('section')
-    return render_template_string(template, items=items, expenses=expenses, activities=activities,
-                                 activity_types=activity_types, maintenance_types=maintenance_types,
-                                 expense_types=expense_types, monthly_totals=dict(monthly_totals),
-                                 yearly_by_description=dict(yearly_by_description), today=today,
-                                 maintenances=maintenances, numbers=numbers)
+    if current_app.config['LAZY_SECTIONS']:
+        loaded = [section_id for section_id, _, loader, _ in SECTIONS if loader is None or section_id == section]
+    else:
+        loaded = [section[0] for section in SECTIONS]
+
+    def render(c, versions):
+        # Intestazione e menu partono prima che le sezioni carichino i dati
+        body = flush_at_markers(stream_template('dashboard.html', sections=SECTIONS,
+                                                fragments=LazyFragments(c, loaded, versions)))
+        if not current_app.config['STREAM_DASHBOARD']:
+            return ''.join(body)
+        response = current_app.response_class(body, mimetype='text/html')
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    return conditional_render(loaded, render)
+
+@route('/section/<section_id>')
+def section(section_id):
+    if not session.get('logged_in'):
+        return '', 401
+    if section_id not in SECTIONS_BY_ID:
+        abort(404)
+    return conditional_render([section_id], lambda c, versions: render_section(c, section_id, versions))
 
-@app.route('/login', methods=['POST'])
+@route('/cache/stats')
+def cache_stats():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    return jsonify(cache.stats())
+
+@route('/metrics')
+def metrics_endpoint():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    return current_app.response_class(metrics.render(metrics.collect()), mimetype='text/plain; version=0.0.4')
+
+# Finestra massima (giorni) restituita da /api/activities
+MAX_ACTIVITY_WINDOW_DAYS = 62
+
+@route('/api/activities')
+def api_activities():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify(error="Parametri 'from' e 'to' richiesti nel formato AAAA-MM-GG"), 400
+    if date_to < date_from or (date_to - date_from).days > MAX_ACTIVITY_WINDOW_DAYS:
+        return jsonify(error=f"Intervallo non valido (massimo {MAX_ACTIVITY_WINDOW_DAYS} giorni)"), 400
+    with get_db() as conn:
+        activities = store.load_activities_between(conn.cursor(), date_from.isoformat(), date_to.isoformat())
+    return jsonify(activities)
+
+# Serie già calcolate e serializzate per intervallo, periodo e raggruppamento:
+# come per le settimane, una nuova versione di expenses sostituisce la vecchia
+series_cache = cache.register('expense_series', 2 * 1024 * 1024)
+
+@route('/api/expenses/series')
+def api_expense_series():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    # Senza intervallo: gli ultimi dodici mesi interi, quello corrente compreso
+    today = datetime.now().date()
+    month_end = (today.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    months = today.year * 12 + today.month - 12
+    year_ago = today.replace(year=months // 12, month=months % 12 + 1, day=1)
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if 'from' in request.args else year_ago
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if 'to' in request.args else month_end
+    except ValueError:
+        return jsonify(error="Parametri 'from' e 'to' nel formato AAAA-MM-GG"), 400
+    bucket = request.args.get('bucket', 'month')
+    group = request.args.get('group', 'type')
+    # date.max non ha un giorno dopo: expense_series lo calcola per capire se i mesi sono interi
+    if (date_to < date_from or date_to == date.max or bucket not in ('day', 'week', 'month')
+            or group not in store.SERIES_GROUPS):
+        return jsonify(error="Intervallo non valido, 'bucket' tra day, week, month e 'group' tra type, spender"), 400
+    # Intervalli lunghi: periodo più grossolano invece di migliaia di punti
+    bucket = store.series_bucket(date_from, date_to, bucket)
+    if bucket is None:
+        return jsonify(error=f"Intervallo troppo lungo: al massimo {store.MAX_SERIES_POINTS} anni"), 400
+    with get_db() as conn:
+        c = conn.cursor()
+        request_key = (db.current_db(), date_from, date_to, bucket, group)
+        key = (request_key, store.get_versions(c, 'expenses'))
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            body = series_cache.get(key)
+            if body is None:
+                labels, series = store.expense_series(c, date_from, date_to, bucket, group)
+                body = json.dumps({'from': date_from.isoformat(), 'to': date_to.isoformat(), 'bucket': bucket,
+                                   'group': group, 'labels': labels,
+                                   'series': [{'name': name, 'data': data} for name, data in series.items()]})
+                series_cache.put(key, body, group=request_key)
+            response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+@route('/api/changes')
+def api_changes():
+    # Modifiche successive a ?since=<seq>, da applicare allo stato già caricato;
+    # "reset": true se il registro non le ha più e bisogna ricaricare tutto
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    since = request.args.get('since', type=int)
+    entities = request.args.get('entity').split(',') if request.args.get('entity') else list(store.CHANGE_LOG_TABLES)
+    if (since is None or not 0 <= since <= store.MAX_SEQ
+            or any(entity not in store.CHANGE_LOG_TABLES for entity in entities)):
+        return jsonify(error=f"Parametro 'since' richiesto; 'entity' tra {', '.join(store.CHANGE_LOG_TABLES)}"), 400
+    limit = min(max(request.args.get('limit', store.MAX_CHANGES, type=int), 1), store.MAX_CHANGES)
+    with get_db() as conn:
+        c = conn.cursor()
+        last = store.last_change(c)
+        rows = store.changes_since(c, since, entities, limit)
+    if rows is None:
+        return jsonify(reset=True, last=last, changes=[])
+    changes = [{'seq': seq, 'entity': entity, 'op': op, 'id': row_id,
+                'data': store.change_data(payload)}
+               for seq, entity, op, row_id, payload in rows]
+    # Con "more" il client richiede di nuovo da "last"
+    more = len(rows) == limit
+    last = rows[-1][0] if more else max(last, since, *(row[0] for row in rows[-1:]))
+    return jsonify(reset=False, last=last, more=more, changes=changes)
+
+@route('/api/changes/stream')
+def api_changes_stream():
+    # Server-Sent Events con le modifiche della famiglia man mano che avvengono;
+    # alla riconnessione il browser manda Last-Event-ID e si riprende da lì
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    entities = request.args.get('entity').split(',') if request.args.get('entity') else events.STREAM_ENTITIES
+    if since is not None and not 0 <= since <= store.MAX_SEQ:
+        return jsonify(error="'since' e Last-Event-ID devono essere un seq valido"), 400
+    if any(entity not in store.CHANGE_LOG_TABLES for entity in entities):
+        return jsonify(error=f"'entity' tra {', '.join(store.CHANGE_LOG_TABLES)}"), 400
+    response = current_app.response_class(events.stream(db.current_db(), since, entities),
+                                          mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Risultati per pagina di /api/search
+SEARCH_PER_PAGE = 20
+MAX_SEARCH_PER_PAGE = 50
+
+@route('/api/search')
+def api_search():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    text = request.args.get('q', '').strip()
+    tables = request.args.get('type', '').split(',') if request.args.get('type') else list(store.SEARCH_TABLES)
+    if not text or any(table not in store.SEARCH_TABLES for table in tables):
+        return jsonify(error=f"Parametro 'q' richiesto; 'type' tra {', '.join(store.SEARCH_TABLES)}"), 400
+    per_page = min(max(request.args.get('per_page', SEARCH_PER_PAGE, type=int), 1), MAX_SEARCH_PER_PAGE)
+    page = min(max(request.args.get('page', 1, type=int), 1), store.SEARCH_MAX_OFFSET // per_page + 1)
+    with get_db() as conn:
+        total, truncated, results = store.search(conn.cursor(), text, tables, per_page, (page - 1) * per_page)
+    # total conta tutte le corrispondenze; con truncated la classifica di una parola
+    # troppo comune copre solo le store.SEARCH_CANDIDATES più recenti per tabella
+    return jsonify(query=text, page=page, per_page=per_page, total=total, truncated=truncated,
+                   ranked_limit=store.SEARCH_CANDIDATES if truncated else None, results=results)
+
+# Settimane già raggruppate e serializzate, indicizzate per data di inizio e versioni
+# dei dati: una scrittura su activities o activity_types (in qualsiasi worker)
+# cambia la chiave e la nuova voce sostituisce quella vecchia della stessa settimana
+week_cache = cache.register('activity_weeks', 2 * 1024 * 1024)
+
+@route('/api/activities/week')
+def api_activity_week():
+    if not session.get('logged_in'):
+        return jsonify(error="Accesso richiesto"), 401
+    try:
+        week_start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify(error="Parametro 'start' richiesto nel formato AAAA-MM-GG"), 400
+    # I sette giorni devono esistere tutti
+    if week_start > date.max - timedelta(days=6):
+        return jsonify(error="Parametro 'start' fuori intervallo"), 400
+    with get_db() as conn:
+        c = conn.cursor()
+        key = (db.current_db(), week_start, store.get_versions(c, 'activities', 'activity_types'))
+        body = week_cache.get(key)
+        if body is None:
+            body = json.dumps(store.load_activity_week(c, week_start))
+            week_cache.put(key, body, group=key[:2])
+    return current_app.response_class(body, mimetype='application/json')
+
+@route('/login', methods=['POST'])
 def login():
     username = request.form['username']
     password = request.form['password']
-    with sqlite3.connect(DB_NAME) as conn:
+    # L'utente sta nel database della sua famiglia, indicata dalla directory
+    household_id = households.household_of(username)
+    db.use_db(households.db_name(household_id))
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("SELECT id, password, first_name, last_name FROM users WHERE username = ?", (username,))
+        c.execute(store.LOGIN_SQL, (username,))
         user = c.fetchone()
-        if user and bcrypt.check_password_hash(user[1], password):
+        if user and passwords.check_password(user[1], password):
+            if passwords.needs_rehash(user[1]):
+                passwords.rehash_later(user[0], user[1], password)
             session['logged_in'] = True
+            session['household_id'] = household_id
             session['user_id'] = user[0]
             session['username'] = username
             session['first_name'] = user[2]
             session['last_name'] = user[3]
             return redirect(url_for('home'))
-    return render_template_string(template, error="Nome utente o password errati")
+    return render_template('login.html', error="Nome utente o password errati")
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         first_name = request.form['first_name']
         last_name = request.form['last_name']
         username = request.form['username']
         password = request.form['password']
-        hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
+        household_name = request.form.get('household', '').strip()
+        hashed_pw = passwords.hash_password(password)
         plain_pw = password
-        with sqlite3.connect(DB_NAME) as conn:
+        # Il nome utente si riserva nella directory, unico tra tutte le famiglie; senza
+        # il nome di una nuova famiglia si entra in quella predefinita
+        try:
+            households.add_member(username, households.DEFAULT_HOUSEHOLD)
+        except sqlite3.IntegrityError:
+            return render_template('register.html', error="Nome utente già in uso")
+        household_id = households.DEFAULT_HOUSEHOLD
+        if household_name:
+            try:
+                household_id = households.create_household(household_name)
+            except sqlite3.IntegrityError:
+                households.remove_member(username)
+                # Si entra in una famiglia esistente con flask add-member
+                return render_template('register.html', error="Nome della famiglia già in uso: per entrare in quella "
+                                                              "famiglia registrati senza e chiedi di esservi aggiunto")
+            households.set_member(username, household_id)
+        db.use_db(households.db_name(household_id))
+        with get_db() as conn:
             c = conn.cursor()
             try:
                 c.execute("INSERT INTO users (username, password, plain_password, first_name, last_name) VALUES (?, ?, ?, ?, ?)",
@@ -733,19 +488,21 @@ def register():
                 conn.commit()
                 return redirect(url_for('home'))
             except sqlite3.IntegrityError:
-                return render_template_string(template, error="Nome utente già in uso")
-    return render_template_string(template, error=None)
+                households.remove_member(username)
+                return render_template('register.html', error="Nome utente già in uso")
+    return render_template('register.html', error=None)
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.pop('logged_in', None)
+    session.pop('household_id', None)
     session.pop('user_id', None)
     session.pop('username', None)
     session.pop('first_name', None)
     session.pop('last_name', None)
     return redirect(url_for('home'))
 
-@app.route('/add', methods=['POST'])
+@route('/add', methods=['POST'])
 def add_item():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
@@ -753,51 +510,75 @@ def add_item():
     quantity = int(request.form.get('quantity', 1))
     notes = request.form.get('notes', '').strip() or None
     user_id = session.get('user_id')
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("SELECT item FROM shopping_list WHERE item = ?", (item,))
-        if not c.fetchone():
-            c.execute("INSERT INTO shopping_list (user_id, item, quantity, notes) VALUES (?, ?, ?, ?)", (user_id, item, quantity, notes))
+        store.add_items(c, [(user_id, item, quantity, notes)])
+        conn.commit()
+    return redirect(url_for('home'))
+
+# Riga di una lista incollata: punto elenco e quantità iniziale facoltativi ("- 2 latte", "3x uova").
+# Il nome non può iniziare con un punto elenco, o una riga fatta solo di "•" o "- " diventerebbe un elemento
+PASTED_ITEM = re.compile(r'^[-*•\s]*(?:(\d+)\s*[x×]?\s+)?([^-*•\s].*?)\s*$')
+
+def parse_item_lines(text, user_id):
+    rows = []
+    for line in text.splitlines():
+        match = PASTED_ITEM.match(line)
+        if match:
+            rows.append((user_id, match.group(2), int(match.group(1) or 1), None))
+    return rows
+
+@route('/add_items', methods=['POST'])
+def add_items():
+    if not session.get('logged_in'):
+        return redirect(url_for('home'))
+    rows = parse_item_lines(request.form.get('items', ''), session.get('user_id'))
+    if rows:
+        # Tutta la lista in una sola transazione
+        with get_db() as conn:
+            c = conn.cursor()
+            store.add_items(c, rows)
             conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/remove_item/<int:item_id>')
+@route('/remove_item/<int:item_id>')
 def remove_item(item_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM shopping_list WHERE id = ?", (item_id,))
+        store.remove_items(c, [item_id])
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_expense', methods=['POST'])
+@route('/add_expense', methods=['POST'])
 def add_expense():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
     date = request.form['date']
     description = request.form['description']
-    amount = float(request.form['amount'])
     spender = request.form['spender'].strip()
     user_id = session.get('user_id')
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("INSERT INTO expenses (user_id, date, description, amount, spender) VALUES (?, ?, ?, ?, ?)",
-                 (user_id, date, description, amount, spender))
+        try:
+            store.add_expense(c, user_id, date, description, float(request.form['amount']), spender)
+        except ValueError:
+            abort(400)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/remove_expense/<int:expense_id>')
+@route('/remove_expense/<int:expense_id>')
 def remove_expense(expense_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+        store.remove_expense(c, expense_id)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_activity', methods=['POST'])
+@route('/add_activity', methods=['POST'])
 def add_activity():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
@@ -807,121 +588,119 @@ def add_activity():
     location = request.form['location'].strip()
     activity_type = request.form['activity_type']
     user_id = session.get('user_id')
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("INSERT INTO activities (user_id, activity_date, activity_time, description, location, activity_type) VALUES (?, ?, ?, ?, ?, ?)",
-                 (user_id, activity_date, activity_time, description, location, activity_type))
+        store.add_activity(c, user_id, activity_date, activity_time, description, location, activity_type)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/remove_activity/<int:activity_id>')
+@route('/remove_activity/<int:activity_id>')
 def remove_activity(activity_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM activities WHERE id = ?", (activity_id,))
+        store.remove_activity(c, activity_id)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_activity_type', methods=['POST'])
+@route('/add_activity_type', methods=['POST'])
 def add_activity_type():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
     description = request.form['description'].strip()
     color = request.form['color']
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
         try:
-            c.execute("INSERT INTO activity_types (description, color) VALUES (?, ?)", (description, color))
+            store.add_activity_type(c, description, color)
             conn.commit()
         except sqlite3.IntegrityError:
             pass
     return redirect(url_for('home'))
 
-@app.route('/remove_activity_type/<int:type_id>')
+@route('/remove_activity_type/<int:type_id>')
 def remove_activity_type(type_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM activity_types WHERE id = ?", (type_id,))
+        store.remove_activity_type(c, type_id)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_maintenance_type', methods=['POST'])
+@route('/add_maintenance_type', methods=['POST'])
 def add_maintenance_type():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
     description = request.form['description'].strip()
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
         try:
-            c.execute("INSERT INTO maintenance_types (description) VALUES (?)", (description,))
+            store.add_maintenance_type(c, description)
             conn.commit()
         except sqlite3.IntegrityError:
             pass
     return redirect(url_for('home'))
 
-@app.route('/remove_maintenance_type/<int:type_id>')
+@route('/remove_maintenance_type/<int:type_id>')
 def remove_maintenance_type(type_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM maintenance_types WHERE id = ?", (type_id,))
+        store.remove_maintenance_type(c, type_id)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_expense_type', methods=['POST'])
+@route('/add_expense_type', methods=['POST'])
 def add_expense_type():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
     description = request.form['description'].strip()
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
         try:
-            c.execute("INSERT INTO expense_types (description) VALUES (?)", (description,))
+            store.add_expense_type(c, description)
             conn.commit()
         except sqlite3.IntegrityError:
             pass
     return redirect(url_for('home'))
 
-@app.route('/remove_expense_type/<int:type_id>')
+@route('/remove_expense_type/<int:type_id>')
 def remove_expense_type(type_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM expense_types WHERE id = ?", (type_id,))
+        store.remove_expense_type(c, type_id)
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_maintenance', methods=['POST'])
+@route('/add_maintenance', methods=['POST'])
 def add_maintenance():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
     maintenance_date = request.form['maintenance_date']
     description = request.form['description']
     user_id = session.get('user_id')
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("INSERT INTO bike_maintenance (user_id, maintenance_date, description) VALUES (?, ?, ?)",
-                 (user_id, maintenance_date, description))
+        store.add_maintenances(c, [(user_id, maintenance_date, description)])
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/remove_maintenance/<int:maintenance_id>')
+@route('/remove_maintenance/<int:maintenance_id>')
 def remove_maintenance(maintenance_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM bike_maintenance WHERE id = ?", (maintenance_id,))
+        store.remove_maintenances(c, [maintenance_id])
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/add_number', methods=['POST'])
+@route('/add_number', methods=['POST'])
 def add_number():
     if not session.get('logged_in'):
         return redirect(url_for('home'))
@@ -929,23 +708,63 @@ def add_number():
     phone_number = request.form['phone_number'].strip()
     notes = request.form['notes'].strip() or None
     user_id = session.get('user_id')
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("INSERT INTO useful_numbers (user_id, description, phone_number, notes) VALUES (?, ?, ?, ?)",
-                 (user_id, description, phone_number, notes))
+        store.add_numbers(c, [(user_id, description, phone_number, notes)])
         conn.commit()
     return redirect(url_for('home'))
 
-@app.route('/remove_number/<int:number_id>')
+@route('/remove_number/<int:number_id>')
 def remove_number(number_id):
     if not session.get('logged_in'):
         return redirect(url_for('home'))
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM useful_numbers WHERE id = ?", (number_id,))
+        store.remove_numbers(c, [number_id])
         conn.commit()
     return redirect(url_for('home'))
 
+def create_app(config=None):
+    app = Flask(__name__)
+    app.secret_key = 'una_chiave_segreta_molto_sicura'
+    app.config['LAZY_SECTIONS'] = os.getenv('LAZY_SECTIONS', '1') != '0'
+    app.config['STREAM_DASHBOARD'] = os.getenv('STREAM_DASHBOARD', '1') != '0'
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    app.config.update(config or {})
+    passwords.init_app(app)
+    events.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    app.register_blueprint(api_v1)
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    for cli_command in COMMANDS:
+        app.cli.add_command(cli_command)
+    assets.init_app(app)
+    section_cache.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+
+    # Template Jinja in templates/: compilati una sola volta qui e tenuti nella
+    # cache dell'ambiente, con la bytecode cache su disco per i processi successivi.
+    # Con gunicorn --preload lo fa il master e i worker li ereditano col fork
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    template_names = sorted(app.jinja_env.list_templates())
+    for template_name in template_names:
+        app.jinja_env.get_template(template_name)
+    # Impronta dei template e degli asset: un deploy che cambia gli uni o gli altri
+    # invalida gli ETag, altrimenti un 304 terrebbe in vita pagine che puntano ad
+    # asset con impronta già cancellati da assets.build()
+    app.config['TEMPLATES_FINGERPRINT'] = hashlib.sha1(''.join(
+        [app.jinja_env.loader.get_source(app.jinja_env, name)[0] for name in template_names]
+        + [app.config['ASSETS_FINGERPRINT']]
+    ).encode()).hexdigest()
+
+    # Le migrazioni si eseguono una volta per deploy (fase release del Procfile);
+    # qui si legge solo la versione, in sola lettura, e si migra se il database è indietro
+    if not schema.is_current(db.DB_NAME):
+        schema.migrate_db(db.DB_NAME)
+    households.init_app(app)
+    return app
+
 if __name__ == '__main__':
     port = int(os.getenv("PORT", 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
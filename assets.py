@@ -0,0 +1,126 @@
+# CSS, JavaScript e immagini serviti con l'impronta del contenuto nel nome.
+# build() copia ogni file di ASSETS in static/dist/ come <nome>.<hash>.<ext>,
+# con le varianti .gz e .br già compresse per i testi, e scrive il manifest
+# nome originale -> nome con impronta. Un file con impronta non cambia mai, quindi
+# /assets/ lo serve con Cache-Control immutable per un anno: le visite successive
+# scaricano solo l'HTML. Se i sorgenti cambiano, init_app() ricostruisce tutto
+# all'avvio; senza manifest asset_url() torna agli URL di /static/.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # senza il modulo brotli si generano solo le varianti gzip
+    brotli = None
+
+ASSETS = ('css/app.css', 'js/app.js', 'vendor/chart.umd.min.js', 'logo.png')
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+# Un anno: il contenuto di un URL con impronta non cambia
+MAX_AGE = 365 * 24 * 3600
+# Varianti precompresse, nell'ordine di preferenza
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {}
+_dist_dir = None
+
+
+def _sources_digest(static_folder):
+    digest = hashlib.sha256()
+    for name in ASSETS:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as out:
+        out.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def build(static_folder):
+    dist = os.path.join(static_folder, BUILD_DIR)
+    files = {}
+    written = set()
+    for name in ASSETS:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        files[name] = hashed
+        path = os.path.join(dist, hashed)
+        _write(path, data)
+        written.add(path)
+        if ext in COMPRESSIBLE:
+            # mtime=0: a parità di sorgente l'output è identico byte per byte
+            _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+            written.add(path + '.gz')
+            if brotli is not None:
+                _write(path + '.br', brotli.compress(data, quality=11))
+                written.add(path + '.br')
+    manifest = {'sources': _sources_digest(static_folder), 'files': files}
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2).encode())
+    written.add(os.path.join(dist, MANIFEST))
+    # Le impronte dei build precedenti non servono più
+    for root, _, filenames in os.walk(dist):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if path not in written:
+                os.remove(path)
+    return manifest
+
+
+def load(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def asset_url(name):
+    hashed = _manifest.get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('asset', filename=hashed)
+
+
+def serve(filename):
+    path = safe_join(_dist_dir, filename)
+    if path is None or filename == MANIFEST or not os.path.isfile(path):
+        abort(404)
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding = candidate
+            path += suffix
+            break
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], max_age=MAX_AGE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    global _manifest, _dist_dir
+    manifest = load(app.static_folder)
+    if manifest is None or manifest.get('sources') != _sources_digest(app.static_folder):
+        manifest = build(app.static_folder)
+    _manifest = manifest['files']
+    # Le pagine contengono gli URL con impronta: chi calcola gli ETag deve saperlo
+    app.config['ASSETS_FINGERPRINT'] = manifest['sources']
+    _dist_dir = os.path.join(app.static_folder, BUILD_DIR)
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve)
+    app.add_template_global(asset_url)
@@ -0,0 +1,47 @@
+# Funzioni comuni ai benchmark: percentili, revisione git e scrittura del report.
+# I report sono JSON con chiavi stabili, così due esecuzioni su commit diversi si
+# confrontano con un semplice diff.
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    # latencies in secondi; il riepilogo è in millisecondi
+    if not latencies:
+        return {'count': 0}
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+def git_revision(repo=REPO):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(report, output=None, repo=REPO):
+    report = dict(report, revision=git_revision(repo), timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    text = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+    if output:
+        with open(output, 'w', encoding='utf-8') as out:
+            out.write(text)
+    sys.stdout.write(text)
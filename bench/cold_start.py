@@ -0,0 +1,96 @@
+# Avvio a freddo: tempo per importare e costruire l'applicazione in un processo
+# nuovo e, con gunicorn, tempo dall'avvio alla prima risposta 200 su "/",
+# con e senza --preload. Il database (dataset sintetico) è già migrato, come
+# dopo la fase di release.
+#
+# Uso:
+#   python bench/cold_start.py --app "app:create_app()" --workers 2 --repeat 5
+#   python bench/cold_start.py --repo /percorso/altro/checkout --app app:app   # confronto con un altro commit
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import benchlib
+import dataset
+
+# Misura eseguita nel processo figlio: import del modulo e valutazione di "modulo:espressione"
+IMPORT_SNIPPET = """
+import importlib, sys, time
+start = time.perf_counter()
+module_name, _, expression = sys.argv[1].partition(':')
+module = importlib.import_module(module_name)
+eval(expression or 'app', vars(module))
+print(time.perf_counter() - start)
+"""
+
+
+def import_time(args, workdir):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET, args.app], cwd=workdir,
+                            env=dict(os.environ, PYTHONPATH=args.repo), capture_output=True, text=True,
+                            check=True).stdout
+    return float(output.strip().splitlines()[-1]), time.perf_counter() - start
+
+
+def first_response(args, workdir, preload):
+    url = f'http://127.0.0.1:{args.port}/'
+    cmd = ['gunicorn', '--chdir', workdir, '--pythonpath', args.repo, '-b', f'127.0.0.1:{args.port}',
+           '-w', str(args.workers), *(['--preload'] if preload else []), *shlex.split(args.gunicorn_args),
+           args.app]
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < 30:
+            try:
+                request_start = time.perf_counter()
+                urllib.request.urlopen(url).read()
+                now = time.perf_counter()
+                return now - start, now - request_start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"{url} non risponde")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    argv = sys.argv[1:]
+    dataset_argv = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, dataset_argv = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', default='app:create_app()', help="applicazione per gunicorn (modulo:espressione)")
+    parser.add_argument('--repo', default=benchlib.REPO)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--gunicorn-args', default='')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+    args.repo = os.path.abspath(args.repo)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        dataset_args = dataset.parse_args(dataset_argv + ['--db', os.path.join(workdir, 'shopping_list.db')])
+        rows = dataset.generate(dataset_args)
+        imports = [import_time(args, workdir) for _ in range(args.repeat)]
+        results = {'import_and_build': benchlib.summarize([build for build, _ in imports]),
+                   'process_to_exit': benchlib.summarize([total for _, total in imports])}
+        for preload in (False, True):
+            runs = [first_response(args, workdir, preload) for _ in range(args.repeat)]
+            name = 'gunicorn_preload' if preload else 'gunicorn'
+            results[name + '_time_to_first_response'] = benchlib.summarize([total for total, _ in runs])
+            results[name + '_first_request'] = benchlib.summarize([latency for _, latency in runs])
+    benchlib.write_report({'benchmark': 'cold_start', 'app': args.app, 'workers': args.workers,
+                           'repeat': args.repeat, 'dataset': rows, 'results': results}, args.output, args.repo)
+
+
+if __name__ == '__main__':
+    main()
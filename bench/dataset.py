@@ -0,0 +1,143 @@
+# Generatore di dati sintetici per i benchmark.
+# Con lo stesso seed produce sempre lo stesso contenuto (a parità di data di
+# riferimento), scrivendo attraverso store.py così tabelle riassuntive e
+# data_versions restano coerenti. Gli utenti si chiamano bench1..benchN e hanno
+# tutti la stessa password.
+#
+# Uso:
+#   python bench/dataset.py --db shopping_list.db --users 5 --years 5 --activities 5000
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import bcrypt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+import store  # noqa: E402
+
+EXPENSE_TYPES = ["Cibo", "Trasporti", "Bollette", "Svago", "Altro"]
+ACTIVITY_TYPES = [("Sport", "#28a745"), ("Lavoro", "#007bff"), ("Famiglia", "#dc3545"),
+                  ("Medico", "#ffc107"), ("Scuola", "#6f42c1")]
+MAINTENANCE_TYPES = ["Catena", "Freni", "Gomme", "Cambio", "Lavaggio"]
+LOCATIONS = ["Casa", "Ufficio", "Palestra", "Centro", "Scuola", "Parco"]
+FIRST_NAMES = ["Mario", "Anna", "Luca", "Giulia", "Marco", "Sara"]
+LAST_NAMES = ["Rossi", "Bianchi", "Verdi", "Russo", "Ferrari", "Esposito"]
+# Righe per executemany: ogni blocco è una chiamata a store.py
+CHUNK_SIZE = 5000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=db.DB_NAME)
+    parser.add_argument('--replace', action='store_true', help="cancella il database prima di generare")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today(),
+                        help="data di riferimento (AAAA-MM-GG), per risultati identici tra giorni diversi")
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--rounds', type=int, default=4, help="costo bcrypt delle password generate")
+    parser.add_argument('--years', type=int, default=5, help="anni di spese fino a oggi")
+    parser.add_argument('--expenses-per-month', type=int, default=60)
+    parser.add_argument('--activities', type=int, default=5000)
+    parser.add_argument('--maintenances', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--numbers', type=int, default=100)
+    return parser.parse_args(argv)
+
+
+def _write(conn, add, rows):
+    c = conn.cursor()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        with conn:
+            add(c, rows[start:start + CHUNK_SIZE])
+    return len(rows)
+
+
+def _random_day(rng, first, last):
+    return first + timedelta(days=rng.randint(0, (last - first).days))
+
+
+def generate(args):
+    if args.replace:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    # I messaggi delle migrazioni vanno su stderr: stdout resta per il report JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        schema.migrate_db(args.db)
+    rng = random.Random(args.seed)
+    conn = db.connect(args.db)
+    c = conn.cursor()
+    counts = {}
+
+    # Un solo hash per tutti gli utenti: bcrypt è lento per costruzione
+    pw_hash = bcrypt.hashpw(args.password.encode(), bcrypt.gensalt(args.rounds)).decode()
+    with conn:
+        c.executemany("""INSERT OR IGNORE INTO users (username, password, plain_password, first_name, last_name)
+                         VALUES (?, ?, ?, ?, ?)""",
+                      [(f'bench{n}', pw_hash, args.password, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+                       for n in range(1, args.users + 1)])
+        c.execute("SELECT id, first_name || ' ' || last_name FROM users WHERE username LIKE 'bench%'")
+        users = c.fetchall()
+        counts['users'] = len(users)
+        c.executemany("INSERT OR IGNORE INTO expense_types (description) VALUES (?)",
+                      [(name,) for name in EXPENSE_TYPES])
+        c.executemany("INSERT OR IGNORE INTO activity_types (description, color) VALUES (?, ?)", ACTIVITY_TYPES)
+        c.executemany("INSERT OR IGNORE INTO maintenance_types (description) VALUES (?)",
+                      [(name,) for name in MAINTENANCE_TYPES])
+        store.bump_versions(c, 'expense_types', 'activity_types', 'maintenance_types')
+
+    today = args.today
+    first_day = today.replace(year=today.year - args.years) + timedelta(days=1)
+    expenses = []
+    month = first_day.replace(day=1)
+    while month <= today:
+        for _ in range(args.expenses_per_month):
+            user_id, spender = rng.choice(users)
+            day = month.replace(day=rng.randint(1, 28))
+            expenses.append((user_id, day.isoformat(), rng.choice(EXPENSE_TYPES),
+                             round(rng.lognormvariate(3, 1), 2), spender))
+        month = (month + timedelta(days=32)).replace(day=1)
+    counts['expenses'] = _write(conn, store.add_expenses, expenses)
+
+    # Attività distribuite sugli stessi anni e sui prossimi tre mesi
+    activities = []
+    for _ in range(args.activities):
+        day = _random_day(rng, first_day, today + timedelta(days=90))
+        activities.append((rng.choice(users)[0], day.isoformat(),
+                           f"{rng.randint(7, 21):02d}:{rng.choice((0, 15, 30, 45)):02d}",
+                           f"Attività {rng.randint(1, 999)}", rng.choice(LOCATIONS),
+                           rng.choice(ACTIVITY_TYPES)[0]))
+    counts['activities'] = _write(conn, store.add_activities, activities)
+
+    maintenances = [(rng.choice(users)[0], _random_day(rng, first_day, today).isoformat(),
+                     rng.choice(MAINTENANCE_TYPES)) for _ in range(args.maintenances)]
+    counts['bike_maintenance'] = _write(conn, store.add_maintenances, maintenances)
+
+    items = [(rng.choice(users)[0], f"Articolo {n}", rng.randint(1, 6), rng.choice((None, "bio", "offerta")))
+             for n in range(1, args.items + 1)]
+    counts['shopping_list'] = _write(conn, store.add_items, items)
+
+    numbers = [(rng.choice(users)[0], f"Contatto {n}", f"+39 3{rng.randint(10, 99)} {rng.randint(1000000, 9999999)}",
+                None) for n in range(1, args.numbers + 1)]
+    counts['useful_numbers'] = _write(conn, store.add_numbers, numbers)
+
+    conn.close()
+    return counts
+
+
+def main():
+    args = parse_args()
+    counts = generate(args)
+    print(json.dumps({'db': args.db, 'seed': args.seed, 'rows': counts}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Benchmark di importazione ed esportazione delle spese su un database temporaneo.
+#
+# Uso:
+#   python bench/expenses_io_throughput.py --rows 1000000 --format csv
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db  # noqa: E402
+import expenses_io  # noqa: E402
+import schema  # noqa: E402
+
+DESCRIPTIONS = ["Cibo", "Trasporti", "Bollette", "Svago", "Altro"]
+SPENDERS = ["Mario Rossi", "Anna Bianchi"]
+
+
+def write_input(path, rows, fmt, seed):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(expenses_io.EXPORT_COLUMNS)
+        for _ in range(rows):
+            record = (f"{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                      rng.choice(DESCRIPTIONS), round(rng.uniform(1, 200), 2), rng.choice(SPENDERS))
+            if writer:
+                writer.writerow(record)
+            else:
+                out.write(json.dumps(dict(zip(expenses_io.EXPORT_COLUMNS, record))) + '\n')
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        input_path = os.path.join(tmp, f'spese.{args.format}')
+        schema.migrate_db(db_path)
+        write_input(input_path, args.rows, args.format, args.seed)
+        conn = db.connect(db_path)
+        rss_before = max_rss_mb()
+
+        start = time.perf_counter()
+        with open(input_path, encoding='utf-8', newline='') as stream:
+            summary = expenses_io.import_expenses(conn, stream, args.format)
+        import_seconds = time.perf_counter() - start
+
+        export = expenses_io.export_expenses_json if args.format == 'json' else expenses_io.export_expenses_csv
+        start = time.perf_counter()
+        exported_bytes = sum(len(part) for part in export(conn))
+        export_seconds = time.perf_counter() - start
+
+        print(json.dumps({
+            'rows': args.rows,
+            'format': args.format,
+            'imported': summary['imported'],
+            'import_rows_per_s': round(summary['imported'] / import_seconds),
+            'export_rows_per_s': round(args.rows / export_seconds),
+            'export_mb': round(exported_bytes / 1e6, 1),
+            'max_rss_mb_before': round(rss_before, 1),
+            'max_rss_mb_after': round(max_rss_mb(), 1),
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
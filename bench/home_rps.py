@@ -0,0 +1,59 @@
+# Benchmark delle richieste al secondo su "/" per un utente autenticato.
+#
+# Uso (con il server già avviato, es. `gunicorn "app:create_app()"`):
+#   python bench/home_rps.py --url http://127.0.0.1:8000 --seconds 10 --concurrency 4
+import argparse
+import http.cookiejar
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+
+def make_opener(base_url):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    username = 'bench-' + uuid.uuid4().hex[:8]
+    password = 'bench'
+    data = urllib.parse.urlencode({'first_name': 'Bench', 'last_name': 'User',
+                                   'username': username, 'password': password}).encode()
+    opener.open(base_url + '/register', data).read()
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(base_url + '/login', data).read()
+    return opener
+
+
+def worker(opener, url, deadline, counts, index):
+    done = 0
+    while time.perf_counter() < deadline:
+        opener.open(url).read()
+        done += 1
+    counts[index] = done
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    opener = make_opener(args.url)
+    opener.open(args.url + '/').read()  # riscaldamento
+    counts = [0] * args.concurrency
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    threads = [threading.Thread(target=worker, args=(opener, args.url + '/', deadline, counts, i))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = sum(counts)
+    print(f"{total} richieste in {elapsed:.1f}s -> {total / elapsed:.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
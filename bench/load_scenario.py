@@ -0,0 +1,184 @@
+# Scenario di carico HTTP: ogni client virtuale ripete una sessione completa
+# (login, dashboard, sezioni caricate come farebbe il browser, settimana del
+# calendario, aggiunta e rimozione di un articolo) e ogni passo viene cronometrato.
+# Riporta RPS e p50/p95/p99 per passo e complessivi in JSON, sia della risposta
+# completa sia del primo byte (TTFB: header ricevuti, corpo non ancora letto).
+#
+# Senza --url genera un dataset in una cartella temporanea e avvia gunicorn:
+#   python bench/load_scenario.py --seconds 20 --concurrency 8 --gunicorn-args "-w 2" \
+#       --output load.json -- --activities 20000
+# Con --url usa un server già avviato, i cui utenti bench1..N vengono da bench/dataset.py.
+import argparse
+import http.cookiejar
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+import benchlib
+import dataset
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def wait_for(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} non risponde")
+
+
+class Client:
+    def __init__(self, base_url, latencies, ttfb, errors):
+        self.base_url = base_url
+        self.latencies = latencies
+        self.ttfb = ttfb
+        self.errors = errors
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, step, path, data=None):
+        start = time.perf_counter()
+        try:
+            response = self.opener.open(self.base_url + path, data)
+            self.ttfb[step].append(time.perf_counter() - start)
+            status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            self.ttfb[step].append(time.perf_counter() - start)
+            status, body = e.code, e.read()
+        self.latencies[step].append(time.perf_counter() - start)
+        if status >= 400:
+            self.errors[step] += 1
+        return body.decode('utf-8', 'replace')
+
+
+def session(client, username, password, item_name, week_start):
+    client.request('login', '/login', urllib.parse.urlencode(
+        {'username': username, 'password': password}).encode())
+    dashboard = client.request('dashboard', '/')
+    for src in re.findall(r'data-src="([^"]+)"', dashboard):
+        client.request('section ' + src.rsplit('/', 1)[-1], src)
+    # Link diretto a una sezione pesante: la dashboard la include nella prima risposta
+    client.request('dashboard expense-report', '/?section=expense-report')
+    client.request('activity week', '/api/activities/week?start=' + week_start)
+    client.request('add item', '/add', urllib.parse.urlencode(
+        {'item': item_name, 'quantity': 1, 'notes': ''}).encode())
+    shopping_list = client.request('section shopping-list (after add)', '/section/shopping-list')
+    match = re.search(re.escape(item_name) + r'</span>.*?/remove_item/(\d+)', shopping_list, re.S)
+    if match:
+        client.request('remove item', f'/remove_item/{match.group(1)}')
+    client.request('logout', '/logout')
+
+
+def worker(index, args, deadline, latencies, ttfb, errors, sessions):
+    username = f'bench{index % args.users + 1}'
+    today = date.today()
+    week_start = (today - timedelta(days=today.weekday())).isoformat()
+    done = 0
+    while time.perf_counter() < deadline:
+        client = Client(args.url, latencies, ttfb, errors)
+        session(client, username, args.password, f'bench-item-{index}-{done}', week_start)
+        done += 1
+    sessions[index] = done
+
+
+def run_load(args):
+    latencies = defaultdict(list)
+    ttfb = defaultdict(list)
+    errors = defaultdict(int)
+    sessions = [0] * args.concurrency
+    session(Client(args.url, defaultdict(list), defaultdict(list), defaultdict(int)), 'bench1', args.password,
+            'bench-item-warmup', date.today().isoformat())  # riscaldamento
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    threads = [threading.Thread(target=worker, args=(i, args, deadline, latencies, ttfb, errors, sessions))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    requests = sum(len(values) for values in latencies.values())
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'sessions': sum(sessions),
+        'requests': requests,
+        'errors': sum(errors.values()),
+        'rps': round(requests / elapsed, 1),
+        'overall': benchlib.summarize([value for values in latencies.values() for value in values]),
+        'overall_ttfb': benchlib.summarize([value for values in ttfb.values() for value in values]),
+        'steps': {step: dict(benchlib.summarize(values), errors=errors[step])
+                  for step, values in latencies.items()},
+        'steps_ttfb': {step: benchlib.summarize(values) for step, values in ttfb.items()},
+    }
+
+
+def start_gunicorn(workdir, port, gunicorn_args, rounds, env=None):
+    # Stesso costo bcrypt degli utenti generati, per non ricalcolare gli hash al login
+    env = dict(os.environ, BCRYPT_LOG_ROUNDS=str(rounds), **(env or {}))
+    cmd = ['gunicorn', '--chdir', workdir, '--pythonpath', benchlib.REPO, '-b', f'127.0.0.1:{port}',
+           *shlex.split(gunicorn_args), 'app:create_app()']
+    server = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(f'http://127.0.0.1:{port}/')
+    except RuntimeError:
+        server.terminate()
+        server.wait()
+        raise
+    return server
+
+
+def main():
+    argv = sys.argv[1:]
+    dataset_argv = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, dataset_argv = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="server già avviato; senza, ne viene avviato uno temporaneo")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--gunicorn-args', default='')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+    dataset_args = dataset.parse_args(dataset_argv + ['--db', 'shopping_list.db'])
+    args.users = dataset_args.users
+    args.password = dataset_args.password
+    report = {'benchmark': 'load_scenario', 'seconds': args.seconds, 'concurrency': args.concurrency,
+              'gunicorn_args': args.gunicorn_args, 'seed': dataset_args.seed}
+
+    if args.url:
+        report['results'] = run_load(args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            dataset_args.db = os.path.join(tmp, 'shopping_list.db')
+            report['dataset'] = dataset.generate(dataset_args)
+            args.url = f'http://127.0.0.1:{args.port}'
+            server = start_gunicorn(tmp, args.port, args.gunicorn_args, dataset_args.rounds)
+            try:
+                report['results'] = run_load(args)
+            finally:
+                server.terminate()
+                server.wait()
+    benchlib.write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
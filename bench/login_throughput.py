@@ -0,0 +1,101 @@
+# Throughput di /login al variare di BCRYPT_LOG_ROUNDS.
+# Per ogni costo avvia gunicorn su un database temporaneo, registra un utente e
+# lo fa accedere ripetutamente da più client in parallelo.
+#
+# Uso:
+#   python bench/login_throughput.py --rounds 4 8 10 12 --seconds 5 --concurrency 8 \
+#       --gunicorn-args "-k gthread --threads 4"
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def wait_for(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} non risponde")
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def login_loop(url, data, deadline, latencies):
+    opener = urllib.request.build_opener(NoRedirect)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            opener.open(url, data).read()
+        except urllib.error.HTTPError as e:
+            if e.code != 302:
+                raise
+        latencies.append(time.perf_counter() - start)
+
+
+def run(rounds, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BCRYPT_LOG_ROUNDS=str(rounds))
+        base = f"http://127.0.0.1:{args.port}"
+        cmd = ['gunicorn', '--chdir', tmp, '--pythonpath', REPO, '-b', f'127.0.0.1:{args.port}',
+               *shlex.split(args.gunicorn_args), 'app:create_app()']
+        server = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for(base + '/')
+            credentials = {'username': 'bench', 'password': 'bench'}
+            urllib.request.urlopen(base + '/register', urllib.parse.urlencode(
+                dict(credentials, first_name='Bench', last_name='User')).encode()).read()
+            data = urllib.parse.urlencode(credentials).encode()
+            latencies = []
+            start = time.perf_counter()
+            deadline = start + args.seconds
+            threads = [threading.Thread(target=login_loop, args=(base + '/login', data, deadline, latencies))
+                       for _ in range(args.concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    latencies.sort()
+    return {
+        'rounds': rounds,
+        'logins_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, nargs='+', default=[4, 8, 10, 12])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--gunicorn-args', default='')
+    args = parser.parse_args()
+    results = [run(rounds, args) for rounds in args.rounds]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Costo delle metriche: la stessa sequenza di richieste (dashboard, sezioni,
+# settimana del calendario, aggiunta e rimozione di un articolo) eseguita con il
+# test client di Flask in processi separati con METRICS_ENABLED=0 e =1, alternati
+# per più turni, ognuno su una copia del dataset. Per ogni modalità si tiene il
+# turno migliore.
+#
+# Uso:
+#   python bench/metrics_overhead.py --rounds 5 --requests 2000 --output overhead.json
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchlib
+import dataset
+
+SECTIONS = ('shopping-list', 'expense-types', 'useful-numbers', 'bike-maintenance', 'expense-report')
+
+
+def child(requests, sections):
+    # Eseguito nel processo figlio, nella cartella del dataset
+    sys.path.insert(0, benchlib.REPO)
+    import app as app_module
+
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as session:
+        session.update(logged_in=True, user_id=1, username='bench1', first_name='Bench', last_name='User')
+    paths = ['/'] + [f'/section/{section_id}' for section_id in sections] + ['/api/activities/week?start=2024-01-01']
+    done = 0
+    start = time.perf_counter()
+    while done < requests:
+        for path in paths:
+            client.get(path)
+        # Sempre lo stesso articolo: la lista non cresce durante la misura
+        client.post('/add', data={'item': 'overhead', 'quantity': 1})
+        client.get('/remove_item/999999999')
+        done += len(paths) + 2
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'requests': done, 'seconds': elapsed}))
+
+
+def run_child(tmp, enabled, requests, sections):
+    with tempfile.TemporaryDirectory(dir=tmp) as workdir:
+        shutil.copy(os.path.join(tmp, 'shopping_list.db'), workdir)
+        env = dict(os.environ, METRICS_ENABLED='1' if enabled else '0', METRICS_DIR=os.path.join(workdir, 'metrics'))
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(requests),
+                                 ','.join(sections)], cwd=workdir, env=env, capture_output=True, text=True,
+                                check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['seconds'] / result['requests']
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]), [section_id for section_id in sys.argv[3].split(',') if section_id])
+        return
+    argv = sys.argv[1:]
+    dataset_argv = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, dataset_argv = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sections', nargs='*', default=list(SECTIONS))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_args = dataset.parse_args(dataset_argv + ['--db', os.path.join(tmp, 'shopping_list.db')])
+        rows = dataset.generate(dataset_args)
+        per_request = {False: [], True: []}
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                per_request[enabled].append(run_child(tmp, enabled, args.requests, args.sections))
+    off, on = min(per_request[False]), min(per_request[True])
+    benchlib.write_report({
+        'benchmark': 'metrics_overhead',
+        'rounds': args.rounds,
+        'requests_per_round': args.requests,
+        'sections': args.sections,
+        'dataset': rows,
+        'disabled_us_per_request': round(off * 1e6, 1),
+        'enabled_us_per_request': round(on * 1e6, 1),
+        'overhead_pct': round((on - off) / off * 100, 2),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
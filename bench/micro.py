@@ -0,0 +1,94 @@
+# Micro-benchmark delle funzioni più usate su un dataset sintetico:
+# loader di store.py (compresa l'aggregazione delle spese), rendering di ogni
+# sezione, ogni query di schema.HOT_QUERIES e la ricerca full-text con termini
+# rari, comuni e prefissi. Per ciascuna riporta la
+# distribuzione delle latenze in JSON.
+#
+# Uso:
+#   python bench/micro.py --repeat 200 --output micro.json -- --activities 20000 --years 10
+# Gli argomenti dopo "--" vanno al generatore (vedi bench/dataset.py).
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import benchlib
+import dataset
+
+
+# Ricerche misurate: parola presente in quasi tutte le attività, termini rari e prefissi
+SEARCH_TERMS = ('attività', 'attività 12', 'cibo', 'contatto 15', 'arti', 'xyzzy')
+
+
+def measure(fn, repeat):
+    fn()  # riscaldamento
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return benchlib.summarize(latencies)
+
+
+def run(args, dataset_args):
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py apre db.DB_NAME relativo alla cartella corrente
+        os.chdir(tmp)
+        rows = dataset.generate(dataset_args)
+        sys.path.insert(0, benchlib.REPO)
+        import app as app_module
+        import schema
+        import store
+        from flask import render_template
+
+        app = app_module.create_app()
+        conn = app_module.get_db()
+        c = conn.cursor()
+        results = {'loaders': {}, 'render': {}, 'queries': {}, 'search': {}}
+
+        for section_id, template_name, loader, _ in app_module.SECTIONS:
+            with app.test_request_context('/'):
+                if loader:
+                    results['loaders'][section_id] = measure(lambda: loader(c), args.repeat)
+                data = loader(c) if loader else {}
+                results['render'][section_id] = measure(lambda: render_template(template_name, **data),
+                                                        args.repeat)
+
+        week_start = dataset_args.today - timedelta(days=dataset_args.today.weekday())
+        results['loaders']['activity-week'] = measure(lambda: store.load_activity_week(c, week_start),
+                                                      args.repeat)
+
+        for name, sql, params, _ in schema.HOT_QUERIES:
+            results['queries'][name] = measure(lambda: c.execute(sql, params).fetchall(), args.repeat)
+        # add_item scrive davvero: il dataset resta quello generato
+        conn.rollback()
+
+        for text in SEARCH_TERMS:
+            results['search'][text] = measure(lambda: store.search(c, text, list(store.SEARCH_TABLES),
+                                                                   app_module.SEARCH_PER_PAGE, 0), args.repeat)
+        app_module.db.close_db()
+        os.chdir(benchlib.REPO)
+    return rows, results
+
+
+def main():
+    argv = sys.argv[1:]
+    dataset_argv = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, dataset_argv = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+    dataset_args = dataset.parse_args(dataset_argv + ['--db', 'shopping_list.db'])
+
+    rows, results = run(args, dataset_args)
+    benchlib.write_report({'benchmark': 'micro', 'repeat': args.repeat, 'seed': dataset_args.seed,
+                           'dataset': rows, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Confronto dei modelli di worker di gunicorn.conf.py (sync, gthread, gevent) con
+# lo scenario di bench/load_scenario.py: stesso dataset sintetico, un server per
+# modello avviato con la configurazione del Procfile, e per ogni livello di
+# concorrenza RPS, errori e p50/p95/p99 complessivi e dei passi più pesanti
+# (login con bcrypt, dashboard, report spese).
+#
+# Uso:
+#   python bench/worker_models.py --seconds 20 --concurrency 4 16 --output workers.json \
+#       -- --activities 20000 --rounds 10
+# --workers fissa WEB_CONCURRENCY; senza, il numero di processi viene dalle CPU.
+import argparse
+import os
+import sys
+import tempfile
+
+import benchlib
+import dataset
+import load_scenario
+
+MODELS = ('sync', 'gthread', 'gevent')
+# Passi riportati anche nel riepilogo, oltre al complessivo
+KEY_STEPS = ('login', 'dashboard', 'section expense-report', 'add item')
+
+
+def run_model(model, args, workdir, dataset_args):
+    env = {'WORKER_CLASS': model}
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    gunicorn_args = f'-c {os.path.join(benchlib.REPO, "gunicorn.conf.py")} {args.gunicorn_args}'
+    server = load_scenario.start_gunicorn(workdir, args.port, gunicorn_args, dataset_args.rounds, env)
+    try:
+        results = {}
+        for concurrency in args.concurrency:
+            load_args = argparse.Namespace(url=f'http://127.0.0.1:{args.port}', seconds=args.seconds,
+                                           concurrency=concurrency, users=dataset_args.users,
+                                           password=dataset_args.password)
+            results[str(concurrency)] = load_scenario.run_load(load_args)
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summary(results):
+    rows = {}
+    for model, by_concurrency in results.items():
+        for concurrency, result in by_concurrency.items():
+            row = {'rps': result['rps'], 'errors': result['errors'],
+                   'p50_ms': result['overall'].get('p50_ms'), 'p95_ms': result['overall'].get('p95_ms'),
+                   'p99_ms': result['overall'].get('p99_ms')}
+            for step in KEY_STEPS:
+                if step in result['steps']:
+                    row[step + ' p99_ms'] = result['steps'][step].get('p99_ms')
+            rows[f'{model} c={concurrency}'] = row
+    return rows
+
+
+def main():
+    argv = sys.argv[1:]
+    dataset_argv = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, dataset_argv = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--workers', type=int, help="WEB_CONCURRENCY; senza, dalle CPU")
+    parser.add_argument('--port', type=int, default=8768)
+    parser.add_argument('--gunicorn-args', default='', help="argomenti aggiunti a quelli di gunicorn.conf.py")
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        dataset_args = dataset.parse_args(dataset_argv + ['--db', os.path.join(workdir, 'shopping_list.db')])
+        rows = dataset.generate(dataset_args)
+        results = {model: run_model(model, args, workdir, dataset_args) for model in args.models}
+    benchlib.write_report({'benchmark': 'worker_models', 'seconds': args.seconds, 'concurrency': args.concurrency,
+                           'workers': args.workers, 'cpus': os.cpu_count(), 'seed': dataset_args.seed,
+                           'dataset': rows, 'summary': summary(results), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
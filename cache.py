@@ -0,0 +1,88 @@
+# Cache LRU in memoria per frammenti già renderizzati (HTML o JSON serializzato).
+# Le chiavi contengono le versioni dei dati (tabella data_versions nello stesso
+# file SQLite): quando un worker scrive, gli altri calcolano una chiave diversa
+# alla richiesta successiva, quindi l'invalidazione arriva a tutti i processi
+# senza messaggi tra worker. Ogni voce appartiene a un gruppo (es. la sezione):
+# inserendo una nuova versione si scartano subito quelle vecchie dello stesso gruppo.
+import sys
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chiave -> (gruppo, valore, dimensione)
+        self._groups = {}  # gruppo -> chiave corrente
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, group=None):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if group is not None:
+                stale = self._groups.get(group)
+                if stale is not None:
+                    self._remove(stale)
+                self._groups[group] = key
+            self._entries[key] = (group, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        group, _, size = self._entries.pop(key)
+        self._bytes -= size
+        if group is not None and self._groups.get(group) == key:
+            del self._groups[group]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+# Cache registrate, per esporre le statistiche tutte insieme
+caches = {}
+
+
+def register(name, max_bytes):
+    caches[name] = FragmentCache(name, max_bytes)
+    return caches[name]
+
+
+def stats():
+    return {name: fragment_cache.stats() for name, fragment_cache in caches.items()}
@@ -0,0 +1,212 @@
+# Connessioni SQLite condivise da tutte le route.
+# Ogni thread (e ogni processo worker) riusa la propria connessione invece di
+# aprirne una nuova a ogni richiesta: così si risparmia il setup e la cache
+# delle istruzioni preparate di sqlite3 resta calda tra una richiesta e l'altra.
+# Ogni famiglia ha il proprio file (vedi households.py): use_db() sceglie il file
+# del thread corrente e get_db() tiene aperta una connessione per file.
+# Con i worker gevent threading.local vale per greenlet, cioè per richiesta: le
+# connessioni si prendono allora da un pool del processo e release() le restituisce
+# a fine richiesta, così restano aperte e con la cache delle istruzioni calda.
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from forksafe import per_process
+
+try:
+    from gevent import monkey
+except ImportError:  # senza gevent ci sono solo thread veri
+    monkey = None
+
+# Database della famiglia predefinita, usato fuori dalle richieste (comandi, thread)
+DB_NAME = "shopping_list.db"
+
+# Attesa massima (secondi) su un database bloccato prima di "database is locked"
+BUSY_TIMEOUT = 5.0
+# Numero di istruzioni compilate tenute in cache per connessione
+STATEMENT_CACHE_SIZE = 256
+# Connessioni aperte al massimo da un thread: oltre, si chiude la meno usata
+MAX_OPEN_DATABASES = 8
+# Con gevent: connessioni libere tenute nel pool per file, oltre si chiudono
+POOL_SIZE = 16
+
+PRAGMAS = (
+    # WAL: i lettori non bloccano lo scrittore e viceversa, anche tra worker
+    "PRAGMA journal_mode = WAL",
+    # In WAL, NORMAL è sicuro contro la corruzione e risparmia un fsync per commit
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Se attivo (lo accendono metrics.init_app e profiling.init_app), le connessioni
+# aperte da connect() contano le istruzioni SQL e il tempo passato in SQLite
+# (execute più fetch) del thread corrente
+TIME_STATEMENTS = False
+
+_local = threading.local()
+# Connessioni aperte, per thread; le connessioni del processo padre non si riusano
+_connections = per_process(threading.local)
+# Con gevent: file -> connessioni libere del processo
+_pool = per_process(dict)
+_pooled = per_process(lambda: monkey is not None and monkey.is_module_patched('threading'))
+
+
+def _record(sql, seconds, statements=0, rows=0):
+    _local.statements = getattr(_local, 'statements', 0) + statements
+    _local.sql_seconds = getattr(_local, 'sql_seconds', 0.0) + seconds
+    by_sql = getattr(_local, 'by_sql', None)
+    if by_sql is not None:
+        entry = by_sql.get(sql)
+        if entry is None:
+            entry = by_sql[sql] = [0, 0.0, 0]
+        entry[0] += statements
+        entry[1] += seconds
+        entry[2] += rows
+
+
+def reset_statement_stats():
+    _local.statements = 0
+    _local.sql_seconds = 0.0
+
+
+def statement_stats():
+    # (istruzioni eseguite, secondi in SQLite) dall'ultimo reset_statement_stats()
+    return getattr(_local, 'statements', 0), getattr(_local, 'sql_seconds', 0.0)
+
+
+def trace_statements(enabled):
+    # Con il tracciamento attivo si accumulano esecuzioni, tempo e righe per testo SQL
+    _local.by_sql = {} if enabled else None
+
+
+def traced_statements():
+    # {sql: [esecuzioni, secondi, righe lette o modificate]}
+    return getattr(_local, 'by_sql', None) or {}
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        self.sql = sql
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            _record(sql, time.perf_counter() - start, 1, max(self.rowcount, 0))
+
+    def executemany(self, sql, *args):
+        self.sql = sql
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            _record(sql, time.perf_counter() - start, 1, max(self.rowcount, 0))
+
+    # SQLite produce le righe mentre vengono lette: anche il fetch è tempo di query
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        _record(getattr(self, 'sql', None), time.perf_counter() - start, rows=row is not None)
+        return row
+
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        rows = super().fetchmany(*args)
+        _record(getattr(self, 'sql', None), time.perf_counter() - start, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        _record(getattr(self, 'sql', None), time.perf_counter() - start, rows=len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def connect(db_name=None):
+    # Nel pool una connessione passa tra greenlet e, per i thread veri di gevent
+    # (hash bcrypt), tra thread diversi, ma mai a due insieme
+    conn = sqlite3.connect(db_name or DB_NAME, timeout=BUSY_TIMEOUT,
+                           cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=not _pooled(),
+                           factory=TimedConnection if TIME_STATEMENTS else sqlite3.Connection)
+    for pragma in PRAGMAS:
+        # Alcuni PRAGMA restituiscono una riga: il cursore va chiuso, o per SQLite
+        # l'istruzione resta in corso e il commit successivo fallisce
+        conn.execute(pragma).close()
+    return conn
+
+
+def use_db(db_name):
+    # File usato da get_db() nel thread corrente; None torna a DB_NAME
+    _local.db_name = db_name
+
+
+def current_db():
+    return getattr(_local, 'db_name', None) or DB_NAME
+
+
+def _open_connections():
+    local = _connections()
+    conns = getattr(local, 'conns', None)
+    if conns is None:
+        conns = local.conns = OrderedDict()
+    return conns
+
+
+def _checkout(db_name):
+    idle = _pool().get(db_name) if _pooled() else None
+    return idle.pop() if idle else connect(db_name)
+
+
+def _checkin(db_name, conn):
+    if _pooled():
+        # Una transazione lasciata aperta non deve passare alla richiesta successiva
+        if conn.in_transaction:
+            conn.rollback()
+        idle = _pool().setdefault(db_name, [])
+        if len(idle) < POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def get_db(db_name=None):
+    db_name = db_name or current_db()
+    conns = _open_connections()
+    conn = conns.get(db_name)
+    if conn is None:
+        conn = conns[db_name] = _checkout(db_name)
+        while len(conns) > MAX_OPEN_DATABASES:
+            _checkin(*conns.popitem(last=False))
+    else:
+        conns.move_to_end(db_name)
+    return conn
+
+
+def release():
+    # A fine richiesta: con gevent le connessioni del greenlet tornano al pool; con
+    # i thread restano al thread, che le riusa alla richiesta successiva
+    if not _pooled():
+        return
+    conns = _open_connections()
+    while conns:
+        _checkin(*conns.popitem())
+
+
+def close_db():
+    conns = _open_connections()
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
@@ -0,0 +1,168 @@
+# Notifiche push delle modifiche (Server-Sent Events).
+# Il canale tra i worker è il registro change_log nel file SQLite della famiglia:
+# in ogni processo un solo thread controlla, ogni SSE_POLL_INTERVAL secondi, l'ultimo
+# seq delle famiglie con almeno uno stream aperto, legge le modifiche nuove una
+# volta sola e sveglia tutti gli stream in attesa. Gli stream non toccano il
+# database se non per recuperare, all'apertura, ciò che il client non ha visto
+# (parametro since o header Last-Event-ID).
+# Uno stream resta aperto al massimo SSE_MAX_SECONDS, poi il browser si riconnette
+# dopo SSE_RETRY millisecondi riprendendo dall'ultimo id ricevuto. Con worker sync
+# o gthread uno stream aperto occupa un worker o un thread, quindi il valore
+# predefinito è 0: ogni connessione invia solo il recupero e si chiude, e il
+# browser in pratica interroga ogni SSE_RETRY ms. Con worker gevent ogni stream è
+# un greenlet e gunicorn.conf.py li tiene aperti a lungo.
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import db
+import store
+from forksafe import per_process
+
+# Entità inviate se il client non ne chiede altre
+STREAM_ENTITIES = ('shopping_list', 'expenses', 'activities')
+# Modifiche tenute in memoria per famiglia: uno stream rimasto più indietro riceve "reset"
+BACKLOG = 1000
+
+logger = logging.getLogger(__name__)
+
+_poll_interval = 0.5
+_heartbeat = 15.0
+_max_seconds = 0.0
+_retry = 5000
+
+
+class Watcher:
+    def __init__(self, last):
+        self.last = last  # ultimo seq letto dal registro
+        self.floor = last  # seq più alto non più in events
+        self.events = deque()  # (seq, entity, op, row_id, payload)
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+    def publish(self, rows):
+        with self.condition:
+            self.events.extend(rows)
+            while len(self.events) > BACKLOG:
+                self.floor = self.events.popleft()[0]
+            self.last = rows[-1][0]
+            self.condition.notify_all()
+
+    def reset(self, last):
+        # Il registro è stato compattato oltre ciò che avevamo letto
+        with self.condition:
+            self.events.clear()
+            self.last = self.floor = last
+            self.condition.notify_all()
+
+
+def _check(db_name, watcher):
+    c = db.get_db(db_name).cursor()
+    if store.last_change(c) == watcher.last:
+        return
+    rows = store.changes_since(c, watcher.last, list(store.CHANGE_LOG_TABLES), store.MAX_CHANGES)
+    if rows is None:
+        watcher.reset(store.last_change(c))
+    elif rows:
+        watcher.publish(rows)
+
+
+def _poll(watchers):
+    while True:
+        time.sleep(_poll_interval)
+        for db_name, watcher in list(watchers.items()):
+            if not watcher.subscribers:
+                continue
+            # Un errore su una famiglia (database bloccato, file sparito) non deve
+            # fermare il thread: si riprova al giro successivo
+            try:
+                _check(db_name, watcher)
+            except Exception:
+                logger.exception("Controllo delle modifiche di %s non riuscito", db_name)
+
+
+def _start_poller():
+    watchers = {}  # file della famiglia -> Watcher
+    threading.Thread(target=_poll, args=(watchers,), name='change-poller', daemon=True).start()
+    return watchers
+
+
+_watchers = per_process(_start_poller)
+
+
+def _watcher(db_name):
+    watchers = _watchers()
+    watcher = watchers.get(db_name)
+    if watcher is None:
+        # Due stream che aprono insieme la stessa famiglia tengono lo stesso Watcher
+        watcher = watchers.setdefault(db_name, Watcher(store.last_change(db.get_db(db_name).cursor())))
+    return watcher
+
+
+def _event(seq, entity, op, row_id, payload):
+    data = json.dumps({'seq': seq, 'entity': entity, 'op': op, 'id': row_id,
+                       'data': store.change_data(payload)})
+    return f'id: {seq}\nevent: change\ndata: {data}\n\n'
+
+
+def stream(db_name, since, entities):
+    # Generatore del corpo text/event-stream; since None = solo le modifiche da ora
+    watcher = _watcher(db_name)
+    with watcher.condition:
+        watcher.subscribers += 1
+    try:
+        # Recupero dal database di ciò che è successo dopo since; non basta watcher.last,
+        # che il thread aggiorna solo finché la famiglia ha stream aperti
+        c = db.get_db(db_name).cursor()
+        position = store.last_change(c) if since is None else since
+        while store.last_change(c) > position:
+            rows = store.changes_since(c, position, list(store.CHANGE_LOG_TABLES), store.MAX_CHANGES)
+            if rows is None:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if not rows:
+                break
+            for seq, entity, op, row_id, payload in rows:
+                if entity in entities:
+                    yield _event(seq, entity, op, row_id, payload)
+            position = rows[-1][0]
+        # Da qui lo stream aspetta il thread di controllo e non usa più il database
+        db.release()
+        # L'id anche senza eventi: una riconnessione riparte da qui
+        yield f'retry: {_retry}\nid: {position}\n\n'
+        deadline = time.monotonic() + _max_seconds
+        while time.monotonic() < deadline:
+            with watcher.condition:
+                if watcher.last <= position:
+                    watcher.condition.wait(min(_heartbeat, max(deadline - time.monotonic(), 0)))
+                if position < watcher.floor:
+                    pending = None
+                else:
+                    pending = [event for event in watcher.events if event[0] > position]
+            if pending is None:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if not pending:
+                yield f': ping\nid: {position}\n\n'
+            for event in pending:
+                position = event[0]
+                if event[1] in entities:
+                    yield _event(*event)
+    finally:
+        with watcher.condition:
+            watcher.subscribers -= 1
+
+
+def init_app(app):
+    global _poll_interval, _heartbeat, _max_seconds, _retry
+    app.config.setdefault('SSE_POLL_INTERVAL', float(os.getenv('SSE_POLL_INTERVAL', 0.5)))
+    app.config.setdefault('SSE_HEARTBEAT', float(os.getenv('SSE_HEARTBEAT', 15)))
+    app.config.setdefault('SSE_MAX_SECONDS', float(os.getenv('SSE_MAX_SECONDS', 0)))
+    app.config.setdefault('SSE_RETRY', int(os.getenv('SSE_RETRY', 5000)))
+    _poll_interval = app.config['SSE_POLL_INTERVAL']
+    _heartbeat = app.config['SSE_HEARTBEAT']
+    _max_seconds = app.config['SSE_MAX_SECONDS']
+    _retry = app.config['SSE_RETRY']
@@ -0,0 +1,161 @@
+# Importazione ed esportazione in blocco delle spese (CSV o JSON).
+# Entrambe lavorano a flusso: l'import legge il file riga per riga e scrive a
+# blocchi di IMPORT_CHUNK_SIZE righe, una transazione per blocco; l'export legge
+# dal cursore con fetchmany e produce il file un pezzo alla volta. In nessun
+# caso il file o la tabella vengono tenuti interamente in memoria.
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+import store
+
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_BATCH_SIZE = 1000
+# Errori di validazione riportati al massimo nel riepilogo dell'import
+MAX_REPORTED_ERRORS = 100
+# Byte letti per volta dal file JSON e dimensione massima di un singolo oggetto
+JSON_READ_SIZE = 64 * 1024
+MAX_JSON_RECORD_SIZE = 1024 * 1024
+
+EXPORT_COLUMNS = ('date', 'description', 'amount', 'spender')
+FORMATS = ('csv', 'json')
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def detect_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_csv_records(stream):
+    reader = csv.DictReader(stream)
+    missing = set(EXPORT_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f"Colonne mancanti nel CSV: {', '.join(sorted(missing))}")
+    yield from reader
+
+
+def iter_json_records(stream):
+    # Accetta sia un array JSON di oggetti sia un oggetto per riga (JSON Lines),
+    # decodificando un oggetto alla volta da un buffer di dimensione limitata
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[')
+        if buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof or len(buffer) > MAX_JSON_RECORD_SIZE:
+                    raise ImportFormatError("JSON non valido")
+            else:
+                yield record
+                buffer = buffer[end:]
+                continue
+        if eof:
+            return
+        chunk = stream.read(JSON_READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def parse_amount(value):
+    value = str(value).strip()
+    if ',' in value and '.' not in value:
+        value = value.replace(',', '.')
+    amount = float(value)
+    # float() accetta anche "nan" e "inf", che il database e il JSON non reggono
+    if not math.isfinite(amount):
+        raise ValueError("importo non valido")
+    if amount < 0:
+        raise ValueError("importo negativo")
+    return amount
+
+
+def validate_record(record, expense_types):
+    if not isinstance(record, dict):
+        raise ValueError("atteso un oggetto")
+    date = datetime.strptime(str(record.get('date') or '').strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+    description = str(record.get('description') or '').strip()
+    if description not in expense_types:
+        raise ValueError(f"tipo di spesa sconosciuto '{description}'")
+    amount = parse_amount(record.get('amount'))
+    spender = str(record.get('spender') or '').strip()
+    if not spender:
+        raise ValueError("spender obbligatorio")
+    return date, description, amount, spender
+
+
+def import_expenses(conn, stream, fmt, user_id=None):
+    # stream: file di testo; restituisce il riepilogo dell'importazione
+    c = conn.cursor()
+    c.execute("SELECT description FROM expense_types")
+    expense_types = {row[0] for row in c.fetchall()}
+    records = iter_json_records(stream) if fmt == 'json' else iter_csv_records(stream)
+
+    imported = 0
+    rejected = 0
+    errors = []
+    chunk = []
+    for number, record in enumerate(records, start=1):
+        try:
+            chunk.append((user_id,) + validate_record(record, expense_types))
+        except (ValueError, TypeError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"record {number}: {e}")
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            with conn:
+                imported += store.add_expenses(c, chunk)
+            chunk = []
+    if chunk:
+        with conn:
+            imported += store.add_expenses(c, chunk)
+    return {'imported': imported, 'rejected': rejected, 'errors': errors}
+
+
+def iter_expenses(conn):
+    c = conn.cursor()
+    c.execute("SELECT date, description, amount, spender FROM expenses ORDER BY date, id")
+    while True:
+        rows = c.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def export_expenses_csv(conn):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_expenses(conn):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_expenses_json(conn):
+    # Array JSON scritto a pezzi: "[", un oggetto per riga separati da virgole, "]"
+    separator = '[\n'
+    for rows in iter_expenses(conn):
+        parts = []
+        for row in rows:
+            parts.append(separator + json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            separator = ',\n'
+        yield ''.join(parts)
+    yield '[]\n' if separator == '[\n' else '\n]\n'
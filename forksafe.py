@@ -0,0 +1,27 @@
+# Stato che vale per un solo processo. Con --preload l'app nasce nel master di
+# gunicorn e i worker la ereditano con il fork, ma thread, pool di thread e
+# connessioni SQLite del padre non vanno usati nel figlio. per_process(factory)
+# restituisce una funzione che crea il valore al primo uso in ogni processo e
+# poi restituisce sempre quello; dopo un fork si riparte da capo.
+import os
+import threading
+
+
+def per_process(factory):
+    state = {}
+
+    def reset():
+        state.clear()
+        # Un lock preso da un altro thread al momento del fork resterebbe chiuso
+        state['lock'] = threading.Lock()
+
+    def get():
+        if 'value' not in state:
+            with state['lock']:
+                if 'value' not in state:
+                    state['value'] = factory()
+        return state['value']
+
+    reset()
+    os.register_at_fork(after_in_child=reset)
+    return get
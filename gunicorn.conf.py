@@ -0,0 +1,42 @@
+# Configurazione di gunicorn usata dal Procfile (gunicorn -c gunicorn.conf.py).
+# Il modello di worker si sceglie con WORKER_CLASS:
+#   sync     una richiesta per processo alla volta (predefinito)
+#   gthread  processi con GUNICORN_THREADS thread ciascuno: un login bcrypt o una
+#            dashboard lenta occupano un thread, non il processo
+#   gevent   una richiesta per greenlet, fino a GUNICORN_WORKER_CONNECTIONS per
+#            processo; l'unico che tiene aperti a lungo gli stream /api/changes/stream
+# Il numero di processi viene dalle CPU (2 per CPU + 1, il consiglio di gunicorn);
+# WEB_CONCURRENCY lo sovrascrive. Il lavoro è quasi tutto CPU (SQLite, Jinja,
+# bcrypt), quindi a parità di processi i tre modelli servono circa le stesse
+# richieste al secondo: i numeri per scegliere vengono da bench/worker_models.py.
+import multiprocessing
+import os
+
+worker_class = os.getenv('WORKER_CLASS', 'sync')
+workers = int(os.getenv('WEB_CONCURRENCY', 0)) or multiprocessing.cpu_count() * 2 + 1
+threads = int(os.getenv('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+# L'app si costruisce una volta nel master e i worker la ereditano con il fork
+preload_app = True
+timeout = 30
+keepalive = 5
+
+if worker_class == 'gevent':
+    # Con preload_app l'app si importa nel master, prima delle patch che il worker
+    # gevent applica da sé: i threading.local creati all'import (connessioni SQLite,
+    # famiglia della richiesta) resterebbero condivisi da tutti i greenlet.
+    # Questo file si esegue prima dell'import dell'app, quindi le patch vanno qui.
+    from gevent import monkey
+
+    monkey.patch_all()
+    # Uno stream aperto costa solo un greenlet: può durare quanto il keepalive dei
+    # proxy. Con gli altri modelli events.py chiude subito ogni connessione
+    os.environ.setdefault('SSE_MAX_SECONDS', '300')
+    os.environ.setdefault('SSE_RETRY', '1000')
+
+
+def on_starting(server):
+    # Le metriche dei worker di un avvio precedente non vanno sommate alle nuove
+    import metrics
+
+    metrics.clear()
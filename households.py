@@ -0,0 +1,234 @@
+# Famiglie: ogni famiglia ha il proprio file SQLite con tutte le tabelle della
+# dashboard, utenti compresi, così le scritture di una famiglia non aspettano il
+# lock di un'altra e i file possono stare su dischi diversi. Il piccolo database
+# directory.db contiene solo l'elenco delle famiglie con il percorso del loro
+# file e la famiglia di ogni nome utente. A ogni richiesta il file della famiglia
+# in sessione diventa quello di get_db(); senza famiglia si usa db.DB_NAME, che è
+# anche il file della famiglia predefinita creata al primo avvio.
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from flask import session
+
+import db
+import schema
+
+DIRECTORY_DB = 'directory.db'
+HOUSEHOLDS_DIR = 'households'
+DEFAULT_HOUSEHOLD = 1
+
+_db_names = {}  # id famiglia -> file, già migrato in questo processo
+_lock = threading.Lock()
+
+
+def _directory():
+    return db.connect(DIRECTORY_DB)
+
+
+def create_directory():
+    # Idempotente: più processi che partono insieme creano una sola famiglia predefinita
+    conn = _directory()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('''CREATE TABLE IF NOT EXISTS households (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                name TEXT NOT NULL UNIQUE,
+                                db_name TEXT UNIQUE,
+                                created_at TEXT NOT NULL)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS members (
+                                username TEXT PRIMARY KEY,
+                                household_id INTEGER NOT NULL,
+                                FOREIGN KEY (household_id) REFERENCES households(id))''')
+            if conn.execute("SELECT 1 FROM households WHERE id = ?", (DEFAULT_HOUSEHOLD,)).fetchone():
+                return
+            conn.execute("INSERT INTO households (id, name, db_name, created_at) VALUES (?, ?, ?, ?)",
+                         (DEFAULT_HOUSEHOLD, 'Famiglia', db.DB_NAME, datetime.now().isoformat(timespec='seconds')))
+            # Gli utenti già registrati restano nella famiglia predefinita
+            default = db.connect(db.DB_NAME)
+            try:
+                usernames = default.execute("SELECT username FROM users").fetchall()
+            except sqlite3.OperationalError:
+                usernames = []
+            finally:
+                default.close()
+            conn.executemany("INSERT OR IGNORE INTO members (username, household_id) VALUES (?, ?)",
+                             [(username, DEFAULT_HOUSEHOLD) for username, in usernames])
+    finally:
+        conn.close()
+
+
+def directory_ready():
+    # Sola lettura, come schema.is_current(): all'avvio nessun lock in scrittura
+    try:
+        conn = sqlite3.connect(Path(DIRECTORY_DB).absolute().as_uri() + '?mode=ro', uri=True)
+    except sqlite3.OperationalError:
+        return False
+    try:
+        return conn.execute("SELECT 1 FROM households WHERE id = ?", (DEFAULT_HOUSEHOLD,)).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def db_name(household_id):
+    # File della famiglia; al primo uso nel processo lo schema viene portato in pari
+    household_id = household_id or DEFAULT_HOUSEHOLD
+    name = _db_names.get(household_id)
+    if name is not None:
+        return name
+    conn = _directory()
+    try:
+        row = conn.execute("SELECT db_name FROM households WHERE id = ?", (household_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    with _lock:
+        if household_id not in _db_names:
+            if not schema.is_current(row[0]):
+                schema.migrate_db(row[0])
+            _db_names[household_id] = row[0]
+    return row[0]
+
+
+def all_db_names():
+    conn = _directory()
+    try:
+        return [name for name, in conn.execute("SELECT db_name FROM households ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def household_of(username):
+    # I nomi non presenti nella directory appartengono alla famiglia predefinita
+    conn = _directory()
+    try:
+        row = conn.execute("SELECT household_id FROM members WHERE username = ?", (username,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else DEFAULT_HOUSEHOLD
+
+
+def create_household(name, path=None):
+    # Solleva sqlite3.IntegrityError se il nome è già usato
+    conn = _directory()
+    try:
+        with conn:
+            household_id = conn.execute("INSERT INTO households (name, created_at) VALUES (?, ?)",
+                                        (name, datetime.now().isoformat(timespec='seconds'))).lastrowid
+            path = path or os.path.join(HOUSEHOLDS_DIR, f'{household_id}.db')
+            conn.execute("UPDATE households SET db_name = ? WHERE id = ?", (path, household_id))
+    finally:
+        conn.close()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    schema.migrate_db(path)
+    return household_id
+
+
+def add_member(username, household_id):
+    # Solleva sqlite3.IntegrityError se il nome utente è già in una famiglia
+    conn = _directory()
+    try:
+        with conn:
+            conn.execute("INSERT INTO members (username, household_id) VALUES (?, ?)", (username, household_id))
+    finally:
+        conn.close()
+
+
+def set_member(username, household_id):
+    conn = _directory()
+    try:
+        with conn:
+            conn.execute("UPDATE members SET household_id = ? WHERE username = ?", (household_id, username))
+    finally:
+        conn.close()
+
+
+def move_member(username, household_id):
+    # Porta un utente già registrato in un'altra famiglia: la sua riga di users passa
+    # nel file della nuova famiglia, ciò che ha inserito resta in quella vecchia.
+    # Solleva LookupError se l'utente o la famiglia non esistono, ValueError se ne fa
+    # già parte o se il nome è già usato nel file della nuova famiglia
+    source = db_name(household_of(username))
+    target = db_name(household_id)
+    if target is None:
+        raise LookupError(f"la famiglia {household_id} non esiste")
+    if target == source:
+        raise ValueError(f"{username} fa già parte della famiglia {household_id}")
+    conn = db.connect(source)
+    try:
+        user = conn.execute("SELECT username, password, plain_password, first_name, last_name FROM users "
+                            "WHERE username = ?", (username,)).fetchone()
+    finally:
+        conn.close()
+    if user is None:
+        raise LookupError(f"l'utente {username} non esiste")
+    # Prima la copia, poi la directory, infine la cancellazione: un'interruzione
+    # lascia al più una riga in più nella vecchia famiglia, mai un utente senza riga
+    conn = db.connect(target)
+    try:
+        with conn:
+            conn.execute("INSERT INTO users (username, password, plain_password, first_name, last_name) "
+                         "VALUES (?, ?, ?, ?, ?)", user)
+    except sqlite3.IntegrityError:
+        raise ValueError(f"il nome {username} è già usato nella famiglia {household_id}")
+    finally:
+        conn.close()
+    # Gli utenti della famiglia predefinita possono non avere una riga in members
+    conn = _directory()
+    try:
+        with conn:
+            conn.execute("INSERT INTO members (username, household_id) VALUES (?, ?) "
+                         "ON CONFLICT (username) DO UPDATE SET household_id = excluded.household_id",
+                         (username, household_id))
+    finally:
+        conn.close()
+    conn = db.connect(source)
+    try:
+        with conn:
+            conn.execute("DELETE FROM users WHERE username = ?", (username,))
+    finally:
+        conn.close()
+
+
+def remove_member(username):
+    conn = _directory()
+    try:
+        with conn:
+            conn.execute("DELETE FROM members WHERE username = ?", (username,))
+    finally:
+        conn.close()
+
+
+def _before_request():
+    name = db_name(session.get('household_id'))
+    if name is None:
+        # Famiglia non più presente nella directory: la sessione non vale più
+        session.clear()
+    db.use_db(name)
+
+
+def _teardown_request(exc):
+    db.use_db(None)
+    db.release()
+
+
+def init_app(app):
+    global DIRECTORY_DB, HOUSEHOLDS_DIR
+    app.config.setdefault('DIRECTORY_DB', os.getenv('DIRECTORY_DB', DIRECTORY_DB))
+    app.config.setdefault('HOUSEHOLDS_DIR', os.getenv('HOUSEHOLDS_DIR', HOUSEHOLDS_DIR))
+    DIRECTORY_DB = app.config['DIRECTORY_DB']
+    HOUSEHOLDS_DIR = app.config['HOUSEHOLDS_DIR']
+    # La directory si crea con migrate-db nella fase release; qui solo se manca
+    # (primo avvio senza release), dopo la migrazione di db.DB_NAME i cui utenti
+    # finiscono nella famiglia predefinita
+    if not directory_ready():
+        create_directory()
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,276 @@
+# Metriche delle richieste in formato testo Prometheus.
+# Per ogni endpoint: durata, dimensione della risposta, numero di istruzioni SQL
+# e tempo passato in SQLite; per ogni template: tempo di rendering.
+# Ogni worker accumula gli istogrammi in memoria e li salva al massimo una volta
+# ogni METRICS_FLUSH_INTERVAL secondi in METRICS_DIR/metrics-<pid>.json; /metrics
+# somma i file di tutti i worker, quindi qualunque worker risponda il totale è lo stesso.
+# I file dei worker terminati confluiscono in metrics-retired.json, così i contatori
+# non si perdono e un pid riusato non li fa tornare indietro; il master di gunicorn
+# svuota la cartella all'avvio (on_starting in gunicorn.conf.py).
+# Le risposte in streaming (la dashboard) generano il corpo dopo after_request: la
+# misura si chiude quando l'ultimo pezzo è stato prodotto (vedi after_body).
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from types import GeneratorType
+
+from flask import g, request, before_render_template, template_rendered, stream_with_context
+
+import db
+from forksafe import per_process
+
+try:
+    import fcntl
+except ImportError:  # senza fcntl (Windows) c'è un solo processo e nessun lock
+    fcntl = None
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# nome -> (etichetta, bucket, descrizione)
+RETIRED = 'metrics-retired.json'
+WORKER_FILE = re.compile(r'metrics-(\d+)\.json')
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('endpoint', DURATION_BUCKETS, "Durata delle richieste"),
+    'http_response_size_bytes': ('endpoint', SIZE_BUCKETS, "Dimensione del corpo delle risposte"),
+    'sql_statements_per_request': ('endpoint', STATEMENT_BUCKETS, "Istruzioni SQL eseguite per richiesta"),
+    'sql_duration_per_request_seconds': ('endpoint', DURATION_BUCKETS, "Tempo in SQLite per richiesta"),
+    'template_render_seconds': ('template', DURATION_BUCKETS, "Tempo di rendering dei template"),
+}
+
+_values = {name: {} for name in HISTOGRAMS}  # nome -> etichetta -> [conteggi per bucket..., somma]
+_lock = threading.Lock()
+_local = threading.local()
+_last_flush = 0.0
+_metrics_dir = None
+_flush_interval = 1.0
+
+
+def observe(name, label, value):
+    buckets = HISTOGRAMS[name][1]
+    with _lock:
+        series = _values[name].get(label)
+        if series is None:
+            series = _values[name][label] = [0] * (len(buckets) + 1) + [0.0]
+        series[bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+
+def default_dir():
+    return os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ttapplication-metrics'))
+
+
+def clear(metrics_dir=None):
+    # Alla partenza del master: i file di avvii precedenti non vanno sommati
+    metrics_dir = metrics_dir or _metrics_dir or default_dir()
+    if not os.path.isdir(metrics_dir):
+        return
+    for filename in os.listdir(metrics_dir):
+        if filename.startswith('metrics-') and filename.endswith('.json'):
+            os.remove(os.path.join(metrics_dir, filename))
+
+
+def _path(name):
+    return os.path.join(_metrics_dir, name)
+
+
+def _read(name):
+    try:
+        with open(_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(totals, values):
+    for name, series_by_label in values.items():
+        if name not in totals:
+            continue
+        for label, series in series_by_label.items():
+            total = totals[name].setdefault(label, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+
+
+def _write(name, values):
+    with open(_path(name) + '.tmp', 'w') as out:
+        out.write(values)
+    os.replace(_path(name) + '.tmp', _path(name))
+
+
+@contextmanager
+def _directory_lock():
+    # Lock esclusivo tra i processi che leggono e riscrivono i file della cartella
+    with open(_path('.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retire(filenames):
+    # Da chiamare con il lock: somma i file in metrics-retired.json e li cancella
+    retired = {name: {} for name in HISTOGRAMS}
+    _add(retired, _read(RETIRED) or {})
+    for filename in filenames:
+        _add(retired, _read(filename) or {})
+    _write(RETIRED, json.dumps(retired))
+    for filename in filenames:
+        os.remove(_path(filename))
+
+
+def _retire_previous_owner():
+    # Prima scrittura di questo processo: un file con il suo pid è di un worker
+    # terminato che aveva lo stesso pid
+    filename = f'metrics-{os.getpid()}.json'
+    if os.path.exists(_path(filename)):
+        with _directory_lock():
+            if os.path.exists(_path(filename)):
+                _retire([filename])
+
+
+_claim_file = per_process(_retire_previous_owner)
+
+
+def flush():
+    global _last_flush
+    _claim_file()
+    with _lock:
+        data = json.dumps(_values)
+        _last_flush = time.monotonic()
+    _write(f'metrics-{os.getpid()}.json', data)
+
+
+def collect():
+    # Somma le serie di tutti i file dei worker, compreso quello corrente e quelli
+    # dei worker terminati
+    flush()
+    totals = {name: {} for name in HISTOGRAMS}
+    with _directory_lock():
+        filenames = os.listdir(_metrics_dir)
+        matches = {filename: WORKER_FILE.fullmatch(filename) for filename in filenames}
+        dead = [filename for filename, match in matches.items() if match and not _alive(int(match.group(1)))]
+        if dead:
+            _retire(dead)
+            filenames = os.listdir(_metrics_dir)
+        for filename in filenames:
+            if filename.startswith('metrics-') and filename.endswith('.json'):
+                _add(totals, _read(filename) or {})
+    return totals
+
+
+def render(totals):
+    lines = []
+    for name, (label_name, buckets, description) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for label, series in sorted(totals[name].items()):
+            label = label.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for le, count in zip(buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {series[-1]}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def body_pending(response):
+    # Corpo ancora da generare; i file e gli stream di eventi, che restano aperti
+    # per minuti, si misurano fino agli header
+    return isinstance(response.response, GeneratorType) and response.mimetype != 'text/event-stream'
+
+
+def after_body(response, callback):
+    # callback(byte del corpo) quando il generatore è esaurito o chiuso, ancora nel
+    # contesto della richiesta: le istruzioni SQL e il rendering sono già contati
+    body = response.response
+
+    def generate():
+        size = 0
+        try:
+            for chunk in body:
+                size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+                yield chunk
+        finally:
+            body.close()
+            callback(size)
+    response.response = stream_with_context(generate())
+    return response
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    db.reset_statement_stats()
+
+
+def _finish(endpoint, start, size):
+    observe('http_request_duration_seconds', endpoint, time.perf_counter() - start)
+    statements, sql_seconds = db.statement_stats()
+    observe('sql_statements_per_request', endpoint, statements)
+    observe('sql_duration_per_request_seconds', endpoint, sql_seconds)
+    if size is not None:
+        observe('http_response_size_bytes', endpoint, size)
+    if time.monotonic() - _last_flush >= _flush_interval:
+        flush()
+
+
+def _after_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'not_found'
+    if body_pending(response):
+        return after_body(response, lambda size: _finish(endpoint, start, size))
+    # Per le altre risposte in streaming la lunghezza non è nota, e chiederla
+    # le trasformerebbe in una lista consumando il corpo
+    _finish(endpoint, start, None if response.is_streamed else response.calculate_content_length())
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    stack = getattr(_local, 'render_starts', None)
+    if stack is None:
+        stack = _local.render_starts = []
+    stack.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = getattr(_local, 'render_starts', None)
+    if stack:
+        observe('template_render_seconds', template.name or '<string>', time.perf_counter() - stack.pop())
+
+
+def init_app(app):
+    global _metrics_dir, _flush_interval
+    app.config.setdefault('METRICS_ENABLED', os.getenv('METRICS_ENABLED', '1') != '0')
+    app.config.setdefault('METRICS_DIR', default_dir())
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0)))
+    if not app.config['METRICS_ENABLED']:
+        return
+    db.TIME_STATEMENTS = True
+    _metrics_dir = app.config['METRICS_DIR']
+    _flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+    os.makedirs(_metrics_dir, exist_ok=True)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    atexit.register(flush)
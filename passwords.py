@@ -0,0 +1,77 @@
+# Hash delle password con bcrypt.
+# Il costo si configura con BCRYPT_LOG_ROUNDS; gli hash girano in un pool di
+# thread limitato (bcrypt rilascia il GIL mentre calcola), così un picco di login
+# non occupa più di BCRYPT_MAX_WORKERS core e i thread delle richieste restano
+# liberi. Al login, un hash con un costo diverso da quello configurato viene
+# ricalcolato in background. Con i worker gevent i thread di threading sono
+# greenlet e bcrypt fermerebbe tutto il worker: il pool usa allora thread veri
+# dell'hub di gevent, e chi aspetta l'hash cede il posto alle altre richieste.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_bcrypt import Bcrypt
+
+try:
+    from gevent import monkey
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+except ImportError:  # senza gevent esistono solo i thread di threading
+    monkey = None
+
+from db import current_db, get_db
+from forksafe import per_process
+
+bcrypt = Bcrypt()
+
+_max_workers = 1
+_log_rounds = 12
+
+
+def init_app(app):
+    global _max_workers, _log_rounds
+    app.config.setdefault('BCRYPT_LOG_ROUNDS', int(os.getenv('BCRYPT_LOG_ROUNDS', 12)))
+    app.config.setdefault('BCRYPT_MAX_WORKERS', int(os.getenv('BCRYPT_MAX_WORKERS', os.cpu_count() or 1)))
+    bcrypt.init_app(app)
+    _max_workers = app.config['BCRYPT_MAX_WORKERS']
+    _log_rounds = app.config['BCRYPT_LOG_ROUNDS']
+
+
+def _new_executor():
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return NativeThreadPoolExecutor(max_workers=_max_workers)
+    return ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix='bcrypt')
+
+
+_get_executor = per_process(_new_executor)
+
+
+def hash_password(password):
+    return _get_executor().submit(bcrypt.generate_password_hash, password).result().decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    return _get_executor().submit(bcrypt.check_password_hash, pw_hash, password).result()
+
+
+def hash_rounds(pw_hash):
+    # Formato bcrypt: $2b$<costo>$<sale e hash>
+    try:
+        return int(pw_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(pw_hash):
+    return hash_rounds(pw_hash) != _log_rounds
+
+
+def _rehash(db_name, user_id, old_hash, password):
+    new_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    with get_db(db_name) as conn:
+        # Se nel frattempo la password è cambiata, l'UPDATE non tocca nulla
+        conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                     (new_hash, user_id, old_hash))
+
+
+def rehash_later(user_id, old_hash, password):
+    # Il thread del pool non sa di quale famiglia è la richiesta: il file si passa qui
+    _get_executor().submit(_rehash, current_db(), user_id, old_hash, password)
@@ -0,0 +1,197 @@
+# Profilazione su richiesta e registro delle richieste lente.
+# - Un utente in PROFILING_ADMINS può chiedere il profilo di una richiesta con
+#   l'header "X-Profile: 1" o il parametro ?profile=1: la richiesta gira sotto
+#   cProfile e in PROFILE_DIR vengono scritti <id>.prof (pstats, apribile con
+#   snakeviz o gprof2dot) e <id>.json con route, utente e istruzioni SQL.
+# - Con SLOW_REQUEST_THRESHOLD > 0 (secondi) ogni richiesta più lenta della
+#   soglia viene aggiunta a PROFILE_DIR/slow_requests.log come riga JSON; un
+#   thread campiona lo stack delle richieste che superano la soglia e le
+#   pile raccolte finiscono in <id>.folded, pronto per flamegraph.pl o speedscope.
+#   Con i worker gevent le richieste sono greenlet dello stesso thread e il
+#   campionatore, anch'esso un greenlet, legge gr_frame: vede una richiesta solo
+#   quando cede il controllo, quindi un tratto di solo calcolo compare come il
+#   punto in cui la richiesta si è fermata dopo.
+# Se nessuna delle due opzioni è configurata non viene registrato alcun hook.
+import cProfile
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import count
+
+from flask import g, request, session
+
+try:
+    from gevent import getcurrent, monkey
+except ImportError:  # senza gevent ci sono solo thread veri
+    getcurrent = monkey = None
+
+import db
+import metrics
+from forksafe import per_process
+
+# Istruzioni SQL riportate nel profilo, ordinate per tempo
+TOP_STATEMENTS = 10
+
+_admins = frozenset()
+_threshold = 0.0
+_profile_dir = None
+_sample_interval = 0.005
+_active = {}  # thread id o greenlet -> [inizio, Counter delle pile campionate]
+_ids = count(1)
+_greenlets = per_process(lambda: monkey is not None and monkey.is_module_patched('threading'))
+
+
+def _current():
+    # sys._current_frames() ha un frame per thread del sistema: con gevent tutte le
+    # richieste del worker stanno nello stesso thread e ognuna ha il suo greenlet
+    return getcurrent() if _greenlets() else threading.get_ident()
+
+
+def _request_id():
+    endpoint = request.endpoint or 'not_found'
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_ids)}-{endpoint}"
+
+
+def _table(sql):
+    match = re.search(r'\b(?:FROM|INTO|UPDATE)\s+(\w+)', sql or '', re.I)
+    return match.group(1) if match else None
+
+
+def _report(duration, status):
+    statements = sorted(db.traced_statements().items(), key=lambda item: item[1][1], reverse=True)
+    rows_by_table = Counter()
+    for sql, (_, _, rows) in statements:
+        table = _table(sql)
+        if table:
+            rows_by_table[table] += rows
+    executed, sql_seconds = db.statement_stats()
+    return {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': status,
+        'user_id': session.get('user_id'),
+        'pid': os.getpid(),
+        'duration_ms': round(duration * 1000, 2),
+        'sql_statements': executed,
+        'sql_ms': round(sql_seconds * 1000, 2),
+        'rows_by_table': dict(rows_by_table),
+        'top_sql': [{'sql': ' '.join((sql or '').split()), 'executions': executions,
+                     'ms': round(seconds * 1000, 3), 'rows': rows}
+                    for sql, (executions, seconds, rows) in statements[:TOP_STATEMENTS]],
+    }
+
+
+def _folded(samples):
+    return ''.join(f'{stack} {hits}\n' for stack, hits in samples.most_common())
+
+
+def _write(name, text):
+    with open(os.path.join(_profile_dir, name), 'w', encoding='utf-8') as out:
+        out.write(text)
+
+
+def _sample():
+    # Campiona solo i thread delle richieste che hanno già superato la soglia
+    while True:
+        time.sleep(_sample_interval)
+        now = time.perf_counter()
+        slow = [(key, entry) for key, entry in list(_active.items()) if now - entry[0] >= _threshold]
+        if not slow:
+            continue
+        frames = None if _greenlets() else sys._current_frames()
+        for key, entry in slow:
+            frame = key.gr_frame if frames is None else frames.get(key)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            entry[1][';'.join(reversed(stack))] += 1
+        # I frame tengono vivi i locali della richiesta (cursori compresi) finché
+        # esistono: non vanno conservati durante l'attesa
+        del frames, frame
+
+
+def _new_sampler():
+    threading.Thread(target=_sample, name='slow-request-sampler', daemon=True).start()
+
+
+_start_sampler = per_process(_new_sampler)
+
+
+def _before_request():
+    g.profile_start = time.perf_counter()
+    db.trace_statements(True)
+    db.reset_statement_stats()
+    if _threshold:
+        _start_sampler()
+        _active[_current()] = [g.profile_start, Counter()]
+    wants_profile = request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+    if wants_profile and session.get('username') in _admins:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _finish(start, profiler, request_id, status):
+    if profiler is not None:
+        profiler.disable()
+    duration = time.perf_counter() - start
+    entry = _active.pop(_current(), None)
+    slow = _threshold and duration >= _threshold
+    if profiler is not None or slow:
+        request_id = request_id or _request_id()
+        report = dict(_report(duration, status), id=request_id)
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(_profile_dir, request_id + '.prof'))
+            _write(request_id + '.json', json.dumps(report, indent=2, ensure_ascii=False))
+        if slow:
+            if entry is not None and entry[1]:
+                _write(request_id + '.folded', _folded(entry[1]))
+                report['stacks'] = request_id + '.folded'
+            # Una sola write in append: le righe dei diversi worker non si mescolano
+            with open(os.path.join(_profile_dir, 'slow_requests.log'), 'a', encoding='utf-8') as log:
+                log.write(json.dumps(report, ensure_ascii=False) + '\n')
+    db.trace_statements(False)
+
+
+def _after_request(response):
+    start = g.pop('profile_start', None)
+    if start is None:
+        return response
+    profiler = g.pop('profiler', None)
+    request_id = None
+    if profiler is not None:
+        # L'header parte prima del corpo: l'id si decide qui
+        request_id = _request_id()
+        response.headers['X-Profile-Id'] = request_id
+    if metrics.body_pending(response):
+        # La dashboard in streaming carica i dati mentre genera il corpo
+        return metrics.after_body(response, lambda size: _finish(start, profiler, request_id,
+                                                                  response.status_code))
+    _finish(start, profiler, request_id, response.status_code)
+    return response
+
+
+def init_app(app):
+    global _admins, _threshold, _profile_dir, _sample_interval
+    app.config.setdefault('PROFILING_ADMINS', os.getenv('PROFILING_ADMINS', ''))
+    app.config.setdefault('SLOW_REQUEST_THRESHOLD', float(os.getenv('SLOW_REQUEST_THRESHOLD', 0)))
+    app.config.setdefault('PROFILE_DIR', os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(),
+                                                                               'ttapplication-profiles')))
+    app.config.setdefault('PROFILE_SAMPLE_INTERVAL', float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005)))
+    _admins = frozenset(name.strip() for name in app.config['PROFILING_ADMINS'].split(',') if name.strip())
+    _threshold = app.config['SLOW_REQUEST_THRESHOLD']
+    if not _admins and not _threshold:
+        return
+    _profile_dir = app.config['PROFILE_DIR']
+    _sample_interval = app.config['PROFILE_SAMPLE_INTERVAL']
+    os.makedirs(_profile_dir, exist_ok=True)
+    db.TIME_STATEMENTS = True
+    app.before_request(_before_request)
+    app.after_request(_after_request)
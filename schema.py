@@ -0,0 +1,320 @@
+# Schema del database e migrazioni versionate.
+# Ogni passo di MIGRATIONS viene applicato una sola volta e registrato in
+# schema_version; i passi sono idempotenti, così un database creato prima
+# dell'introduzione delle versioni viene portato in pari senza errori.
+# Un passo non usa store.py né le sue costanti: tabelle, colonne e regole sono
+# scritte nel passo com'erano alla sua versione, altrimenti una modifica a store.py
+# renderebbe i database nuovi diversi da quelli già migrati.
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+
+import store
+
+
+def create_base_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    plain_password TEXT NOT NULL,
+                    first_name TEXT NOT NULL DEFAULT '',
+                    last_name TEXT NOT NULL DEFAULT '')''')
+    c.execute('''CREATE TABLE IF NOT EXISTS shopping_list (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    item TEXT NOT NULL,
+                    quantity INTEGER DEFAULT 1,
+                    notes TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    date TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    spender TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS activities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    activity_date TEXT NOT NULL,
+                    activity_time TEXT NOT NULL DEFAULT '00:00',
+                    description TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    activity_type TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS activity_types (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL UNIQUE,
+                    color TEXT NOT NULL DEFAULT '#000000')''')
+    c.execute('''CREATE TABLE IF NOT EXISTS maintenance_types (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL UNIQUE)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS expense_types (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL UNIQUE)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS bike_maintenance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    maintenance_date TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS useful_numbers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    description TEXT NOT NULL,
+                    phone_number TEXT NOT NULL,
+                    notes TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users(id))''')
+    default_expense_types = [("Cibo",), ("Trasporti",), ("Bollette",), ("Svago",), ("Altro",)]
+    c.executemany("INSERT OR IGNORE INTO expense_types (description) VALUES (?)", default_expense_types)
+
+
+def add_shopping_list_notes(c):
+    # Controlla se la colonna 'notes' esiste nella tabella shopping_list
+    c.execute("PRAGMA table_info(shopping_list)")
+    columns = [col[1] for col in c.fetchall()]
+    if 'notes' not in columns:
+        c.execute("ALTER TABLE shopping_list ADD COLUMN notes TEXT")
+
+
+def create_expense_rollup(c):
+    # Tabella riassuntiva dei totali spese per mese e descrizione
+    c.execute('''CREATE TABLE IF NOT EXISTS expense_monthly_totals (
+                    month TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    total REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (month, description))''')
+    c.execute("DELETE FROM expense_monthly_totals")
+    c.execute("""INSERT INTO expense_monthly_totals (month, description, total, count)
+                 SELECT substr(date, 1, 7), description, SUM(amount), COUNT(*)
+                 FROM expenses GROUP BY substr(date, 1, 7), description""")
+
+
+def create_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_shopping_list_item ON shopping_list (item)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_shopping_list_user ON shopping_list (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user ON expenses (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_date ON activities (activity_date, activity_time)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_user ON activities (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bike_maintenance_user ON bike_maintenance (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_useful_numbers_user ON useful_numbers (user_id)")
+
+
+def create_data_versions(c):
+    # Contatore di modifiche per tabella, incrementato dalle scritture in store.py:
+    # permette a ogni worker di capire se una cache è ancora valida
+    c.execute('''CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0)''')
+
+
+def add_shopping_list_item_key(c):
+    # Chiave normalizzata e unica per l'UPSERT della lista della spesa: i
+    # duplicati già presenti vengono fusi nella riga più vecchia
+    c.execute("PRAGMA table_info(shopping_list)")
+    if 'item_key' not in [col[1] for col in c.fetchall()]:
+        c.execute("ALTER TABLE shopping_list ADD COLUMN item_key TEXT")
+    c.execute("SELECT id, item, quantity, notes FROM shopping_list ORDER BY id")
+    merged = {}
+    duplicates = []
+    for item_id, item, quantity, notes in c.fetchall():
+        # Maiuscole e spazi normalizzati; le note si accodano se non ci sono già
+        key = ' '.join(item.split()).casefold()
+        if key in merged:
+            kept = merged[key]
+            kept[2] += quantity or 0
+            if not kept[3] or not notes:
+                kept[3] = kept[3] or notes
+            elif notes not in kept[3].split('; '):
+                kept[3] = f'{kept[3]}; {notes}'
+            duplicates.append(item_id)
+        else:
+            merged[key] = [item_id, key, quantity or 0, notes]
+    c.executemany("DELETE FROM shopping_list WHERE id = ?", [(item_id,) for item_id in duplicates])
+    c.execute("""INSERT INTO data_versions (name, version) VALUES ('shopping_list', 1)
+                 ON CONFLICT (name) DO UPDATE SET version = version + 1""")
+    c.executemany("UPDATE shopping_list SET item_key = ?, quantity = ?, notes = ? WHERE id = ?",
+                  [(key, quantity, notes, item_id) for item_id, key, quantity, notes in merged.values()])
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_shopping_list_item_key ON shopping_list (item_key)")
+    c.execute("DROP INDEX IF EXISTS idx_shopping_list_item")
+
+
+def create_search_index(c):
+    # Tabelle FTS5 a contenuto esterno: il testo resta solo nella tabella
+    # originale e i trigger aggiornano l'indice nella stessa transazione
+    # Tabelle e colonne indicizzate alla versione 7 (store.SEARCH_TABLES di allora)
+    for table, columns in (('shopping_list', ('item', 'notes')),
+                           ('expenses', ('description', 'spender')),
+                           ('activities', ('description', 'location')),
+                           ('useful_numbers', ('description', 'phone_number', 'notes'))):
+        fts = f'{table}_fts'
+        names = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        c.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}',
+                      content_rowid='id', tokenize='unicode61 remove_diacritics 2')""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                          INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new_values});
+                      END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                          INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+                      END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {names} ON {table} BEGIN
+                          INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+                          INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new_values});
+                      END""")
+        c.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def create_change_log(c):
+    # Registro append-only delle modifiche, scritto dai trigger nella stessa
+    # transazione della scrittura: nessun percorso (route, API, import) lo salta
+    c.execute('''CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entity TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    payload TEXT,
+                    created_at TEXT NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_change_log_created ON change_log (created_at)")
+    # Ultimo seq tolto dalla compattazione per età: chi chiede da prima deve ricaricare tutto
+    c.execute("CREATE TABLE IF NOT EXISTS change_log_compacted (seq INTEGER NOT NULL)")
+    c.execute("SELECT COUNT(*) FROM change_log_compacted")
+    if c.fetchone()[0] == 0:
+        c.execute("INSERT INTO change_log_compacted (seq) VALUES (0)")
+    now = "strftime('%Y-%m-%dT%H:%M:%S', 'now')"
+    # Tabelle registrate e colonne del payload alla versione 8 (store.CHANGE_LOG_TABLES di allora)
+    for table, columns in (('shopping_list', ('user_id', 'item', 'quantity', 'notes')),
+                           ('expenses', ('user_id', 'date', 'description', 'amount', 'spender')),
+                           ('activities', ('user_id', 'activity_date', 'activity_time', 'description', 'location',
+                                           'activity_type')),
+                           ('bike_maintenance', ('user_id', 'maintenance_date', 'description')),
+                           ('useful_numbers', ('user_id', 'description', 'phone_number', 'notes')),
+                           ('activity_types', ('description', 'color')),
+                           ('maintenance_types', ('description',)),
+                           ('expense_types', ('description',))):
+        payload = f"json_object('id', new.id, {', '.join(f'{column!r}, new.{column}' for column in columns)})"
+        for op, row, values in (('insert', 'new', payload), ('update', 'new', payload), ('delete', 'old', "NULL")):
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_log_{op} AFTER {op.upper()} ON {table} BEGIN
+                              INSERT INTO change_log (entity, op, row_id, payload, created_at)
+                              VALUES ('{table}', '{op}', {row}.id, {values}, {now});
+                          END""")
+
+
+# Passi di migrazione in ordine: (versione, descrizione, funzione)
+MIGRATIONS = [
+    (1, "tabelle di base e tipi di spesa predefiniti", create_base_tables),
+    (2, "colonna notes in shopping_list", add_shopping_list_notes),
+    (3, "tabella riassuntiva expense_monthly_totals", create_expense_rollup),
+    (4, "indici per le query principali", create_indexes),
+    (5, "contatori di versione dei dati", create_data_versions),
+    (6, "chiave unica normalizzata della lista della spesa", add_shopping_list_item_key),
+    (7, "indici di ricerca full-text", create_search_index),
+    (8, "registro delle modifiche", create_change_log),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    try:
+        return conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def is_current(db_name):
+    # Sola lettura: nessun lock in scrittura e nessun file creato se il database manca
+    try:
+        conn = sqlite3.connect(Path(db_name).absolute().as_uri() + '?mode=ro', uri=True)
+    except sqlite3.OperationalError:
+        return False
+    try:
+        return current_version(conn) >= LATEST_VERSION
+    finally:
+        conn.close()
+
+
+def migrate_db(db_name):
+    # isolation_level=None: le transazioni sono gestite qui, DDL compresi
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            description TEXT NOT NULL,
+                            applied_at TEXT NOT NULL)''')
+        for version, description, step in MIGRATIONS:
+            if version <= current_version(conn):
+                continue
+            # BEGIN IMMEDIATE serializza i processi che migrano insieme:
+            # chi arriva secondo ricontrolla la versione e salta il passo
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version <= current_version(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                print(f"Migrazione {version}: {description}...")
+                step(conn.cursor())
+                conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                             (version, description, datetime.now().isoformat(timespec='seconds')))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+
+
+# Query più frequenti, prese da store.py così come vengono eseguite, con parametri
+# d'esempio e gli indici che devono usare tutti
+HOT_QUERIES = [
+    ("login", store.LOGIN_SQL, ('x',), ("sqlite_autoindex_users_1",)),
+    ("add_item", store.ADD_ITEM_SQL, (1, 'x', 1, None, 'x'), ("idx_shopping_list_item_key",)),
+    ("pagina del report spese", store.EXPENSE_PAGE_SQL, (store.EXPENSES_PER_PAGE, 0), ("idx_expenses_date",)),
+    ("totali annui per descrizione", store.YEARLY_BY_DESCRIPTION_SQL, ('2024-01', '2024-12'),
+     ("sqlite_autoindex_expense_monthly_totals_1",)),
+    ("pagina di oggi della programmazione", store.ACTIVITIES_BEFORE_SQL, ('2024-01-01',), ("idx_activities_date",)),
+    ("pagina della programmazione", store.ACTIVITY_PAGE_SQL, (store.ACTIVITIES_PER_PAGE, 0), ("idx_activities_date",)),
+    ("attività per intervallo di date", store.ACTIVITIES_BETWEEN_SQL, ('2024-01-01', '2024-01-31'),
+     ("idx_activities_date",)),
+    ("attività della settimana", store.ACTIVITY_WEEK_SQL, ('2024-01-01', '2024-01-07'),
+     ("idx_activities_date", "sqlite_autoindex_activity_types_1")),
+    ("serie spese per mese e tipo",
+     *store.series_query(date(2024, 1, 1), date(2024, 12, 31), 'month', 'type'),
+     ("sqlite_autoindex_expense_monthly_totals_1",)),
+    ("serie spese per settimana e persona",
+     *store.series_query(date(2024, 1, 1), date(2024, 6, 30), 'week', 'spender'), ("idx_expenses_date",)),
+]
+
+
+def query_plan(conn, sql, params):
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    if not plan:
+        # Le scritture non hanno piano: si elencano gli indici che il programma compilato
+        # apre, per un UPSERT compreso quello su cui cerca il conflitto
+        indexes = dict(conn.execute("SELECT rootpage, name FROM sqlite_master WHERE type = 'index'"))
+        plan = [f"OPEN INDEX {indexes[row[3]]}" for row in conn.execute("EXPLAIN " + sql, params)
+                if row[1] in ('OpenRead', 'OpenWrite') and row[3] in indexes]
+    return " | ".join(plan)
+
+
+def check_query_plans(db_name):
+    # Restituisce la lista delle query che non usano gli indici attesi
+    failures = []
+    conn = sqlite3.connect(db_name)
+    try:
+        for name, sql, params, indexes in HOT_QUERIES:
+            try:
+                plan = query_plan(conn, sql, params)
+            except sqlite3.OperationalError as e:
+                # Per esempio un ON CONFLICT senza l'indice unico su cui si appoggia
+                plan = str(e)
+            missing = [index for index in indexes if f"INDEX {index}" not in plan]
+            if missing:
+                failures.append((name, ", ".join(missing), plan))
+    finally:
+        conn.close()
+    return failures
@@ -0,0 +1,365 @@
+function loadSection(sectionId) {
+    const section = document.getElementById(sectionId);
+    if (!section.dataset.src) {
+        return Promise.resolve(section);
+    }
+    return fetch(section.dataset.src, { credentials: 'same-origin' })
+        .then(response => response.text())
+        .then(html => {
+            section.outerHTML = html;
+            const loaded = document.getElementById(sectionId);
+            // Gli script inseriti con outerHTML non vengono eseguiti: li ricreiamo
+            loaded.querySelectorAll('script').forEach(oldScript => {
+                const script = document.createElement('script');
+                Array.from(oldScript.attributes).forEach(attr => script.setAttribute(attr.name, attr.value));
+                script.text = oldScript.textContent;
+                oldScript.replaceWith(script);
+            });
+            return loaded;
+        });
+}
+function showSection(sectionId) {
+    document.querySelector('.menu').style.display = 'none';
+    document.querySelector('.header').style.display = 'none';
+    localStorage.setItem('activeSection', sectionId);
+    loadSection(sectionId).then(section => {
+        document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
+        section.classList.add('active');
+        if (sectionId === 'expense-report') {
+            showSubSection(document.getElementById('expense-options').value);
+        }
+    });
+}
+function showMenu() {
+    document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
+    document.querySelector('.menu').style.display = 'flex';
+    document.querySelector('.header').style.display = 'flex';
+    localStorage.removeItem('activeSection');
+}
+function showSettings() {
+    document.querySelectorAll('.content').forEach(content => content.classList.remove('active'));
+    document.querySelector('.menu').style.display = 'none';
+    document.querySelector('.header').style.display = 'none';
+    document.getElementById('settings').classList.add('active');
+    localStorage.setItem('activeSection', 'settings');
+}
+function showSubSection(subSectionId) {
+    document.querySelectorAll('.subcontent').forEach(content => content.classList.remove('active'));
+    document.getElementById(subSectionId).classList.add('active');
+    localStorage.setItem('activeSubSection', subSectionId);
+    if (subSectionId === 'expense-chart') {
+        drawExpenseChart();
+    }
+}
+// Chart.js (vendorizzato in static/vendor) viene scaricato solo la prima volta
+// che si apre il grafico delle spese
+let chartLibrary = null;
+function loadChartLibrary() {
+    if (!chartLibrary) {
+        chartLibrary = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = document.body.dataset.chartJs;
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+    return chartLibrary;
+}
+// Colori delle serie del grafico spese, in ordine
+const CHART_COLORS = ['#007bff', '#28a745', '#ffc107', '#dc3545', '#6f42c1', '#17a2b8', '#fd7e14', '#6c757d'];
+const BUCKET_NAMES = { day: 'giorno', week: 'settimana', month: 'mese', year: 'anno' };
+let expenseChart = null;
+function drawExpenseChart() {
+    // Serie calcolate dal server per l'intervallo scelto, richieste solo all'apertura del grafico
+    const canvas = document.getElementById('expenseChart');
+    if (!canvas) {
+        return;
+    }
+    const fromInput = document.getElementById('chart-from');
+    const toInput = document.getElementById('chart-to');
+    const bucket = document.getElementById('chart-bucket').value;
+    const params = new URLSearchParams({ bucket: bucket, group: document.getElementById('chart-group').value });
+    if (fromInput.value && toInput.value) {
+        params.set('from', fromInput.value);
+        params.set('to', toInput.value);
+    }
+    const series = fetch(canvas.dataset.src + '?' + params, { credentials: 'same-origin' })
+        .then(response => response.json());
+    Promise.all([series, loadChartLibrary()]).then(([data]) => {
+        const note = document.getElementById('chart-note');
+        if (data.error) {
+            note.textContent = data.error;
+            return;
+        }
+        fromInput.value = data.from;
+        toInput.value = data.to;
+        note.textContent = data.bucket !== bucket ? 'Intervallo lungo: totali per ' + BUCKET_NAMES[data.bucket] + '.' :
+            (data.series.length ? '' : 'Nessun dato disponibile per il grafico.');
+        const chartData = {
+            labels: data.labels,
+            datasets: data.series.map((serie, index) => ({
+                label: serie.name,
+                data: serie.data,
+                backgroundColor: CHART_COLORS[index % CHART_COLORS.length]
+            }))
+        };
+        if (expenseChart && expenseChart.canvas === canvas) {
+            expenseChart.data = chartData;
+            expenseChart.update();
+            return;
+        }
+        if (expenseChart) {
+            expenseChart.destroy();
+        }
+        expenseChart = new Chart(canvas.getContext('2d'), {
+            type: 'bar',
+            data: chartData,
+            options: {
+                scales: {
+                    x: { stacked: true },
+                    y: { stacked: true, beginAtZero: true }
+                }
+            }
+        });
+    });
+}
+window.onload = function() {
+    const urlParams = new URLSearchParams(window.location.search);
+    const section = urlParams.get('section') || localStorage.getItem('activeSection');
+    if (section) {
+        if (section === 'settings') {
+            showSettings();
+        } else {
+            showSection(section);
+        }
+    } else {
+        document.querySelector('.menu').style.display = 'flex';
+        document.querySelector('.header').style.display = 'flex';
+    }
+    listenForChanges();
+}
+function updateSubSection() {
+    const selected = document.getElementById('expense-options').value;
+    showSubSection(selected);
+}
+// Attività della settimana visualizzata, già raggruppate per data dal server
+let weekActivities = {};
+function toggleCalendar() {
+    const calendar = document.getElementById('weekly-calendar');
+    calendar.classList.toggle('active');
+    if (calendar.classList.contains('active')) {
+        updateCalendar();
+    }
+}
+function changeWeek(offset) {
+    const currentWeekStart = new Date(document.getElementById('week-start').value);
+    currentWeekStart.setDate(currentWeekStart.getDate() + (offset * 7));
+    document.getElementById('week-start').value = currentWeekStart.toISOString().split('T')[0];
+    updateCalendar();
+}
+function updateCalendar() {
+    const params = new URLSearchParams({ start: document.getElementById('week-start').value });
+    fetch(document.body.dataset.weekUrl + '?' + params, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(week => {
+            weekActivities = week;
+            renderCalendar();
+        });
+}
+function renderCalendar() {
+    const days = document.querySelectorAll('.calendar-day');
+    Object.keys(weekActivities).forEach((dateStr, index) => {
+        const day = days[index];
+        day.dataset.date = dateStr;
+        day.innerHTML = Number(dateStr.split('-')[2]);
+
+        const dayActivities = weekActivities[dateStr];
+        if (dayActivities.length > 0) {
+            const dots = dayActivities.map(act =>
+                `<span class="activity-dot" style="background-color: ${act.color};" title="${act.description} - ${act.location} (${act.type})"></span>`
+            ).join('');
+            day.innerHTML += '<br>' + dots;
+        }
+    });
+}
+function showDayActivities(date) {
+    const dayActivities = weekActivities[date] || [];
+    const activityList = document.getElementById('day-activities-list');
+    activityList.innerHTML = '';
+    if (dayActivities.length > 0) {
+        dayActivities.forEach(act => {
+            const li = document.createElement('li');
+            li.textContent = `${act.time} - ${act.description} - ${act.location} (${date} ${act.time})`;
+            activityList.appendChild(li);
+        });
+    } else {
+        activityList.innerHTML = '<p class="empty">Nessuna attività per questo giorno.</p>';
+    }
+    document.getElementById('day-activities').classList.add('active');
+}
+function closeDayActivities() {
+    document.getElementById('day-activities').classList.remove('active');
+}
+// Ricerca globale: attende una pausa nella digitazione prima di interrogare il server
+const SEARCH_TYPES = {
+    shopping_list: 'Spesa',
+    expenses: 'Spese',
+    activities: 'Attività',
+    useful_numbers: 'Numeri utili'
+};
+let searchTimer = null;
+function searchAll(text) {
+    clearTimeout(searchTimer);
+    const list = document.getElementById('search-results');
+    if (!text.trim()) {
+        list.innerHTML = '';
+        return;
+    }
+    searchTimer = setTimeout(() => {
+        const params = new URLSearchParams({ q: text });
+        fetch(document.body.dataset.searchUrl + '?' + params, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                if (document.getElementById('search-input').value !== text) {
+                    return;
+                }
+                list.innerHTML = '';
+                (data.results || []).forEach(result => {
+                    const li = document.createElement('li');
+                    const type = document.createElement('span');
+                    type.className = 'search-type';
+                    type.textContent = SEARCH_TYPES[result.type];
+                    li.appendChild(type);
+                    li.appendChild(document.createTextNode(result.title + (result.date ? ' (' + result.date + ')' : '')));
+                    if (result.detail) {
+                        const detail = document.createElement('span');
+                        detail.className = 'search-detail';
+                        detail.textContent = result.detail;
+                        li.appendChild(detail);
+                    }
+                    list.appendChild(li);
+                });
+            });
+    }, 200);
+}
+// Lista della spesa: aggiunte e rimozioni inviate senza seguire il redirect, poi
+// si applicano solo le modifiche successive al seq già visto (/api/changes)
+function renderShoppingItem(row) {
+    const item = document.createElement('div');
+    item.className = 'item';
+    item.dataset.id = row.id;
+    const content = document.createElement('div');
+    content.className = 'item-content';
+    [['item-description', row.item], ['item-quantity', '(' + row.quantity + ')'], ['item-notes', row.notes]]
+        .forEach(([className, text]) => {
+            if (text) {
+                const span = document.createElement('span');
+                span.className = className;
+                span.textContent = text;
+                content.appendChild(span);
+            }
+        });
+    const link = document.createElement('a');
+    link.href = '/remove_item/' + row.id;
+    link.innerHTML = '<button class="remove-btn">Rimuovi</button>';
+    item.append(content, link);
+    return item;
+}
+function applyShoppingChange(change) {
+    const list = document.getElementById('shopping-items');
+    const current = list.querySelector(`.item[data-id="${change.id}"]`);
+    if (change.op === 'delete') {
+        if (current) {
+            current.remove();
+        }
+    } else if (current) {
+        current.replaceWith(renderShoppingItem(change.data));
+    } else {
+        list.insertBefore(renderShoppingItem(change.data), list.querySelector('.empty'));
+    }
+    list.querySelector('.empty').hidden = list.querySelector('.item') !== null;
+}
+function syncShoppingList() {
+    const section = document.getElementById('shopping-list');
+    if (!section || !section.dataset.changeSeq) {
+        return Promise.resolve();
+    }
+    const params = new URLSearchParams({ since: section.dataset.changeSeq, entity: 'shopping_list' });
+    return fetch(document.body.dataset.changesUrl + '?' + params, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.reset) {
+                window.location.reload();
+                return;
+            }
+            // Quelle già arrivate dallo stream di eventi non si riapplicano
+            data.changes.forEach(change => {
+                if (change.seq > Number(section.dataset.changeSeq)) {
+                    applyShoppingChange(change);
+                    section.dataset.changeSeq = change.seq;
+                }
+            });
+            section.dataset.changeSeq = Math.max(Number(section.dataset.changeSeq), data.last);
+            if (data.more) {
+                return syncShoppingList();
+            }
+        });
+}
+document.addEventListener('submit', event => {
+    const form = event.target;
+    if (!form.closest('#shopping-list')) {
+        return;
+    }
+    event.preventDefault();
+    fetch(form.action, { method: 'POST', body: new FormData(form), credentials: 'same-origin', redirect: 'manual' })
+        .then(() => {
+            form.reset();
+            return syncShoppingList();
+        });
+});
+document.addEventListener('click', event => {
+    const link = event.target.closest('#shopping-list .item a');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.href, { credentials: 'same-origin', redirect: 'manual' }).then(syncShoppingList);
+});
+// Modifiche fatte da altri, ricevute in tempo reale (Server-Sent Events): la lista
+// della spesa si aggiorna sul posto, le altre sezioni si ricaricano alla prossima apertura
+const STALE_SECTIONS = { expenses: 'expense-report', activities: 'task-planner' };
+function markSectionStale(sectionId) {
+    const section = document.getElementById(sectionId);
+    if (!section || section.dataset.src || section.classList.contains('active')) {
+        return;
+    }
+    const placeholder = document.createElement('div');
+    placeholder.id = sectionId;
+    placeholder.className = 'content';
+    placeholder.dataset.src = '/section/' + sectionId;
+    section.replaceWith(placeholder);
+}
+function listenForChanges() {
+    if (!window.EventSource || !document.querySelector('.menu')) {
+        return;
+    }
+    const source = new EventSource(document.body.dataset.eventsUrl);
+    // Alla prima apertura si recupera ciò che è successo dopo il caricamento della
+    // pagina; le riconnessioni mandano Last-Event-ID e il recupero lo fa il server
+    source.addEventListener('open', () => syncShoppingList(), {once: true});
+    source.addEventListener('change', event => {
+        const change = JSON.parse(event.data);
+        const section = document.getElementById('shopping-list');
+        if (change.entity !== 'shopping_list') {
+            markSectionStale(STALE_SECTIONS[change.entity]);
+        } else if (section && section.dataset.changeSeq && change.seq > Number(section.dataset.changeSeq)) {
+            applyShoppingChange(change);
+            section.dataset.changeSeq = change.seq;
+        }
+    });
+    source.addEventListener('reset', () => {
+        source.close();
+        window.location.reload();
+    });
+}
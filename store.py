@@ -0,0 +1,541 @@
+# Accesso ai dati della dashboard.
+# Ogni loader riceve un cursore e restituisce le variabili usate dal template
+# della sezione, così home() e /section/<id> caricano solo ciò che serve.
+# Le scritture che toccano tabelle derivate passano da qui per tenerle allineate.
+# Le query frequenti hanno un nome (*_SQL) perché schema.HOT_QUERIES ne controlla
+# il piano così come vengono eseguite.
+import json
+import math
+import re
+from datetime import datetime, timedelta
+
+
+# Usata da /login in app.py
+LOGIN_SQL = "SELECT id, password, first_name, last_name FROM users WHERE username = ?"
+
+
+def load_activity_types(c):
+    c.execute("SELECT id, description, color FROM activity_types")
+    return {'activity_types': c.fetchall()}
+
+
+def load_maintenance_types(c):
+    c.execute("SELECT id, description FROM maintenance_types ORDER BY description ASC")
+    return {'maintenance_types': c.fetchall()}
+
+
+def load_expense_types(c):
+    c.execute("SELECT id, description FROM expense_types")
+    return {'expense_types': c.fetchall()}
+
+
+def load_shopping_list(c):
+    # Il seq si legge prima delle righe: il client riparte da lì con /api/changes e al
+    # più riapplica modifiche che vede già
+    change_seq = last_change(c)
+    c.execute("SELECT id, item, quantity, notes FROM shopping_list")
+    return {'items': c.fetchall(), 'change_seq': change_seq}
+
+
+# Spese mostrate per pagina nell'elenco del rendiconto, dalla più recente
+EXPENSES_PER_PAGE = 50
+EXPENSE_PAGE_SQL = """SELECT id, user_id, date, description, amount, spender FROM expenses
+                      ORDER BY date DESC, id DESC LIMIT ? OFFSET ?"""
+YEARLY_BY_DESCRIPTION_SQL = """SELECT description, SUM(total) FROM expense_monthly_totals
+                               WHERE month BETWEEN ? AND ? GROUP BY description ORDER BY description"""
+
+
+def load_expense_report(c, page=None):
+    # Il numero di spese viene dalla tabella riassuntiva: né il conteggio né l'elenco
+    # leggono tutto lo storico
+    c.execute("SELECT COALESCE(SUM(count), 0) FROM expense_monthly_totals")
+    pages = max(1, -(-c.fetchone()[0] // EXPENSES_PER_PAGE))
+    page = min(max(page or 1, 1), pages)
+    c.execute(EXPENSE_PAGE_SQL, (EXPENSES_PER_PAGE, (page - 1) * EXPENSES_PER_PAGE))
+    expenses = c.fetchall()
+
+    # Totali letti dalla tabella riassuntiva: poche righe per mese, non una per spesa
+    c.execute("SELECT month, SUM(total) FROM expense_monthly_totals GROUP BY month ORDER BY month")
+    monthly_totals = dict(c.fetchall())
+    current_year = datetime.now().year
+    c.execute(YEARLY_BY_DESCRIPTION_SQL, (f'{current_year}-01', f'{current_year}-12'))
+    yearly_by_description = dict(c.fetchall())
+
+    data = load_expense_types(c)
+    data.update(expenses=expenses, expenses_page=page, expenses_pages=pages, monthly_totals=monthly_totals,
+                yearly_by_description=yearly_by_description)
+    return data
+
+
+# Attività mostrate per pagina nell'elenco della programmazione
+ACTIVITIES_PER_PAGE = 50
+ACTIVITY_COLUMNS = "id, user_id, activity_date, activity_time, description, location, activity_type"
+ACTIVITIES_BEFORE_SQL = "SELECT COUNT(*) FROM activities WHERE activity_date < ?"
+ACTIVITY_PAGE_SQL = f"""SELECT {ACTIVITY_COLUMNS} FROM activities
+                        ORDER BY activity_date, activity_time, id LIMIT ? OFFSET ?"""
+ACTIVITIES_BETWEEN_SQL = f"""SELECT {ACTIVITY_COLUMNS} FROM activities
+                             WHERE activity_date BETWEEN ? AND ? ORDER BY activity_date, activity_time"""
+ACTIVITY_WEEK_SQL = """SELECT a.id, a.activity_date, a.activity_time, a.description, a.location, a.activity_type,
+                              COALESCE(t.color, '#000000')
+                       FROM activities a LEFT JOIN activity_types t ON t.description = a.activity_type
+                       WHERE a.activity_date BETWEEN ? AND ? ORDER BY a.activity_date, a.activity_time"""
+
+
+def load_task_planner(c, page=None):
+    # Elenco in ordine cronologico; senza pagina esplicita si parte da quella di oggi
+    today = datetime.now().strftime('%Y-%m-%d')
+    c.execute("SELECT COUNT(*) FROM activities")
+    pages = max(1, -(-c.fetchone()[0] // ACTIVITIES_PER_PAGE))
+    if page is None:
+        c.execute(ACTIVITIES_BEFORE_SQL, (today,))
+        page = c.fetchone()[0] // ACTIVITIES_PER_PAGE + 1
+    page = min(max(page, 1), pages)
+    c.execute(ACTIVITY_PAGE_SQL, (ACTIVITIES_PER_PAGE, (page - 1) * ACTIVITIES_PER_PAGE))
+    data = {'activities': c.fetchall(), 'activities_page': page, 'activities_pages': pages, 'today': today}
+    data.update(load_activity_types(c))
+    return data
+
+
+def load_activities_between(c, date_from, date_to):
+    c.execute(ACTIVITIES_BETWEEN_SQL, (date_from, date_to))
+    return c.fetchall()
+
+
+def load_activity_week(c, week_start):
+    # Attività dei 7 giorni da week_start raggruppate per data, con il colore del tipo
+    days = [(week_start + timedelta(days=offset)).isoformat() for offset in range(7)]
+    week = {day: [] for day in days}
+    c.execute(ACTIVITY_WEEK_SQL, (days[0], days[-1]))
+    for activity_id, date, time, description, location, activity_type, color in c.fetchall():
+        week[date].append({'id': activity_id, 'time': time, 'description': description,
+                           'location': location, 'type': activity_type, 'color': color})
+    return week
+
+
+def load_bike_maintenance(c):
+    c.execute("SELECT id, user_id, maintenance_date, description FROM bike_maintenance")
+    data = {'maintenances': c.fetchall()}
+    data.update(load_maintenance_types(c))
+    return data
+
+
+def load_useful_numbers(c):
+    c.execute("SELECT id, user_id, description, phone_number, notes FROM useful_numbers ORDER BY description ASC")
+    return {'numbers': c.fetchall()}
+
+
+# Ricerca full-text: per ogni tabella la colonna indicizzata in <tabella>_fts
+# (FTS5 a contenuto esterno, tenuta allineata dai trigger creati in schema.py) e le
+# espressioni sulla riga t mostrate nei risultati: titolo, dettaglio e data
+SEARCH_TABLES = {
+    'shopping_list': (('item', 'notes'), "t.item", "t.notes", "NULL"),
+    'expenses': (('description', 'spender'), "t.description",
+                 "t.spender || ' · ' || printf('%.2f', t.amount)", "t.date"),
+    'activities': (('description', 'location'), "t.description",
+                   "t.location || ' · ' || t.activity_type", "t.activity_date || ' ' || t.activity_time"),
+    'useful_numbers': (('description', 'phone_number', 'notes'), "t.description",
+                       "t.phone_number || COALESCE(' · ' || t.notes, '')", "NULL"),
+}
+
+
+# Per il tokenizer i caratteri di controllo separano le parole; tra virgolette un
+# NUL interromperebbe la stringa FTS5
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def search_queries(text):
+    # Ogni parola diventa una stringa tra virgolette, così gli operatori FTS5 nel
+    # testo dell'utente non vengono interpretati: prima le parole intere, poi i soli
+    # prefissi ("lat" trova anche "latte"), senza le righe già trovate dalle prime
+    text = CONTROL_CHARACTERS.sub(' ', text)
+    words = [f'"{word}"' for word in (word.replace('"', '') for word in text.split()) if word]
+    if not words:
+        return ()
+    exact = ' '.join(words)
+    return exact, f"({' '.join(word + '*' for word in words)}) NOT ({exact})"
+
+
+# Ordinare per bm25 costa circa 2,5 µs per corrispondenza (200k righe con una
+# parola comune: quasi mezzo secondo). Fino a SEARCH_RANK_LIMIT corrispondenze per
+# tabella la classifica è esatta; oltre si classificano solo le SEARCH_CANDIDATES
+# più recenti, lette in ordine di rowid, e la risposta lo segnala con truncated
+SEARCH_RANK_LIMIT = 20000
+SEARCH_CANDIDATES = 1000
+# Due livelli per tabella con al più SEARCH_RANK_LIMIT candidati ciascuno: oltre
+# questo offset la pagina è sempre vuota
+SEARCH_MAX_OFFSET = 2 * SEARCH_RANK_LIMIT * len(SEARCH_TABLES)
+
+
+def search(c, text, tables, limit, offset):
+    # Restituisce (corrispondenze totali, classifica troncata, pagina). Ordine:
+    # corrispondenze a parole intere prima di quelle per prefisso, poi bm25 (più
+    # basso è più rilevante), poi le più recenti
+    candidates = []
+    total = 0
+    truncated = False
+    for table in tables:
+        for tier, query in enumerate(search_queries(text)):
+            c.execute(f"SELECT count(*) FROM {table}_fts WHERE {table}_fts MATCH ?", (query,))
+            matches = c.fetchone()[0]
+            total += matches
+            if not matches:
+                continue
+            if matches <= SEARCH_RANK_LIMIT:
+                # Le prime offset + limit di ogni tabella bastano per la pagina complessiva
+                c.execute(f"""SELECT rank, rowid FROM {table}_fts WHERE {table}_fts MATCH ?
+                              ORDER BY rank, rowid DESC LIMIT ?""", (query, offset + limit))
+            else:
+                truncated = True
+                c.execute(f"""SELECT bm25({table}_fts), rowid FROM {table}_fts WHERE {table}_fts MATCH ?
+                              ORDER BY rowid DESC LIMIT ?""", (query, SEARCH_CANDIDATES))
+            candidates.extend((tier, rank, -row_id, table) for rank, row_id in c.fetchall())
+    candidates.sort()
+    page = candidates[offset:offset + limit]
+    rows = {}
+    for table in {table for _, _, _, table in page}:
+        _, title, detail, date = SEARCH_TABLES[table]
+        ids = [-row_id for _, _, row_id, hit_table in page if hit_table == table]
+        c.execute(f"SELECT t.id, {title}, {detail}, {date} FROM {table} t WHERE t.id IN ({', '.join('?' * len(ids))})",
+                  ids)
+        for row_id, title_value, detail_value, date_value in c.fetchall():
+            rows[table, row_id] = {'type': table, 'id': row_id, 'title': title_value, 'detail': detail_value,
+                                   'date': date_value}
+    return total, truncated, [rows[table, -row_id] for _, _, row_id, table in page if (table, -row_id) in rows]
+
+
+# Versioni dei dati: ogni scrittura incrementa il contatore delle tabelle toccate
+def bump_versions(c, *names):
+    c.executemany("""INSERT INTO data_versions (name, version) VALUES (?, 1)
+                     ON CONFLICT (name) DO UPDATE SET version = version + 1""",
+                  [(name,) for name in names])
+
+
+def get_versions(c, *names):
+    c.execute(f"SELECT name, version FROM data_versions WHERE name IN ({', '.join('?' * len(names))})", names)
+    versions = dict(c.fetchall())
+    return tuple(versions.get(name, 0) for name in names)
+
+
+# Righe per istruzione nelle DELETE ... WHERE id IN (...), sotto il limite di variabili di SQLite
+DELETE_CHUNK_SIZE = 500
+
+# Colonne scrivibili delle entità gestite anche in blocco dall'API
+ENTITY_COLUMNS = {
+    'shopping_list': ('user_id', 'item', 'quantity', 'notes'),
+    'expenses': ('user_id', 'date', 'description', 'amount', 'spender'),
+    'activities': ('user_id', 'activity_date', 'activity_time', 'description', 'location', 'activity_type'),
+    'bike_maintenance': ('user_id', 'maintenance_date', 'description'),
+    'useful_numbers': ('user_id', 'description', 'phone_number', 'notes'),
+}
+
+
+# Tabelle registrate in change_log, con le colonne copiate nel payload (oltre a id)
+CHANGE_LOG_TABLES = dict(ENTITY_COLUMNS, activity_types=('description', 'color'),
+                         maintenance_types=('description',), expense_types=('description',))
+# Modifiche restituite al massimo da una lettura del registro
+MAX_CHANGES = 1000
+# seq è un intero di SQLite: un since più grande non si può passare alla query
+MAX_SEQ = 2 ** 63 - 1
+
+
+def last_change(c):
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(c, since, entities, limit):
+    # Modifiche con seq > since in ordine; None se alcune sono già state tolte dalla
+    # compattazione e il client deve ricaricare tutto
+    c.execute("SELECT seq FROM change_log_compacted")
+    if since < c.fetchone()[0]:
+        return None
+    c.execute(f"""SELECT seq, entity, op, row_id, payload FROM change_log
+                  WHERE seq > ? AND entity IN ({', '.join('?' * len(entities))}) ORDER BY seq LIMIT ?""",
+              (since, *entities, limit))
+    return c.fetchall()
+
+
+def change_data(payload):
+    # Payload di una riga di change_log; None se è NULL (cancellazione) o illeggibile,
+    # per esempio un Inf scritto prima che add_expenses lo rifiutasse: una riga
+    # sbagliata non deve fermare tutte le modifiche che seguono
+    if payload is None:
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def compact_changes(c, before):
+    # Per ogni riga basta l'ultima modifica (insert e update portano la riga intera);
+    # poi si tolgono le voci più vecchie di before (AAAA-MM-GGTHH:MM:SS, UTC)
+    c.execute("""DELETE FROM change_log WHERE seq NOT IN
+                 (SELECT MAX(seq) FROM change_log GROUP BY entity, row_id)""")
+    superseded = c.rowcount
+    c.execute("SELECT MAX(seq) FROM change_log WHERE created_at < ?", (before,))
+    floor = c.fetchone()[0]
+    expired = 0
+    if floor is not None:
+        c.execute("DELETE FROM change_log WHERE seq <= ?", (floor,))
+        expired = c.rowcount
+        c.execute("UPDATE change_log_compacted SET seq = MAX(seq, ?)", (floor,))
+        # Frammenti ed ETag contengono il seq da cui ripartire: vanno rigenerati
+        bump_versions(c, *CHANGE_LOG_TABLES)
+    return superseded, expired
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        yield ids[start:start + DELETE_CHUNK_SIZE]
+
+
+def list_rows(c, table, limit, offset):
+    columns = ('id',) + ENTITY_COLUMNS[table]
+    c.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id LIMIT ? OFFSET ?", (limit, offset))
+    return [dict(zip(columns, row)) for row in c.fetchall()]
+
+
+def insert_rows(c, table, rows):
+    # rows: tuple nell'ordine di ENTITY_COLUMNS[table], inserite con un solo executemany
+    columns = ENTITY_COLUMNS[table]
+    c.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+    added = c.rowcount
+    bump_versions(c, table)
+    return added
+
+
+def delete_rows(c, table, ids):
+    deleted = 0
+    for chunk in _chunks(ids):
+        c.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        deleted += c.rowcount
+    bump_versions(c, table)
+    return deleted
+
+
+# Lista della spesa: item_key (maiuscole e spazi normalizzati) è unico, quindi un
+# articolo già presente non viene duplicato ma ne somma quantità e note
+def item_key(item):
+    return ' '.join(item.split()).casefold()
+
+
+def merge_notes(notes, extra):
+    # Stessa regola dell'UPSERT in add_items(): le note nuove si accodano se non ci sono già
+    if not notes or not extra:
+        return notes or extra
+    if extra in notes.split('; '):
+        return notes
+    return f'{notes}; {extra}'
+
+
+ADD_ITEM_SQL = """INSERT INTO shopping_list (user_id, item, quantity, notes, item_key)
+                  VALUES (?, ?, ?, ?, ?)
+                  ON CONFLICT (item_key) DO UPDATE SET
+                      quantity = quantity + excluded.quantity,
+                      notes = CASE
+                          WHEN notes IS NULL OR excluded.notes IS NULL THEN COALESCE(notes, excluded.notes)
+                          WHEN instr('; ' || notes || '; ', '; ' || excluded.notes || '; ') THEN notes
+                          ELSE notes || '; ' || excluded.notes END"""
+
+
+def add_items(c, rows):
+    # rows: (user_id, item, quantity, notes); un solo executemany anche per le liste incollate
+    c.executemany(ADD_ITEM_SQL, [row + (item_key(row[1]),) for row in rows])
+    added = c.rowcount
+    bump_versions(c, 'shopping_list')
+    return added
+
+
+def remove_items(c, ids):
+    return delete_rows(c, 'shopping_list', ids)
+
+
+# Attività e tipi di attività
+def add_activities(c, rows):
+    return insert_rows(c, 'activities', rows)
+
+
+def remove_activities(c, ids):
+    return delete_rows(c, 'activities', ids)
+
+
+def add_activity(c, user_id, activity_date, activity_time, description, location, activity_type):
+    add_activities(c, [(user_id, activity_date, activity_time, description, location, activity_type)])
+
+
+def remove_activity(c, activity_id):
+    remove_activities(c, [activity_id])
+
+
+def add_activity_type(c, description, color):
+    c.execute("INSERT INTO activity_types (description, color) VALUES (?, ?)", (description, color))
+    bump_versions(c, 'activity_types')
+
+
+def remove_activity_type(c, type_id):
+    c.execute("DELETE FROM activity_types WHERE id = ?", (type_id,))
+    bump_versions(c, 'activity_types')
+
+
+# Tipi di manutenzione e di spesa
+def add_maintenance_type(c, description):
+    c.execute("INSERT INTO maintenance_types (description) VALUES (?)", (description,))
+    bump_versions(c, 'maintenance_types')
+
+
+def remove_maintenance_type(c, type_id):
+    c.execute("DELETE FROM maintenance_types WHERE id = ?", (type_id,))
+    bump_versions(c, 'maintenance_types')
+
+
+def add_expense_type(c, description):
+    c.execute("INSERT INTO expense_types (description) VALUES (?)", (description,))
+    bump_versions(c, 'expense_types')
+
+
+def remove_expense_type(c, type_id):
+    c.execute("DELETE FROM expense_types WHERE id = ?", (type_id,))
+    bump_versions(c, 'expense_types')
+
+
+# Manutenzioni e numeri utili
+def add_maintenances(c, rows):
+    return insert_rows(c, 'bike_maintenance', rows)
+
+
+def remove_maintenances(c, ids):
+    return delete_rows(c, 'bike_maintenance', ids)
+
+
+def add_numbers(c, rows):
+    return insert_rows(c, 'useful_numbers', rows)
+
+
+def remove_numbers(c, ids):
+    return delete_rows(c, 'useful_numbers', ids)
+
+
+# Spese e tabella riassuntiva expense_monthly_totals (mese, descrizione)
+def add_expenses(c, rows):
+    # rows: (user_id, date, description, amount, spender). Un importo infinito finirebbe
+    # come Inf, che non è JSON, nel payload di change_log e nelle esportazioni
+    if not all(math.isfinite(amount) for _, _, _, amount, _ in rows):
+        raise ValueError("importo non valido")
+    added = insert_rows(c, 'expenses', rows)
+    c.executemany("""INSERT INTO expense_monthly_totals (month, description, total, count)
+                     VALUES (substr(?, 1, 7), ?, ?, 1)
+                     ON CONFLICT (month, description)
+                     DO UPDATE SET total = total + excluded.total, count = count + 1""",
+                  [(date, description, amount) for _, date, description, amount, _ in rows])
+    return added
+
+
+def remove_expenses(c, ids):
+    deleted = 0
+    for chunk in _chunks(ids):
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f"""SELECT SUM(amount), COUNT(*), substr(date, 1, 7), description FROM expenses
+                      WHERE id IN ({placeholders}) GROUP BY substr(date, 1, 7), description""", chunk)
+        groups = c.fetchall()
+        c.execute(f"DELETE FROM expenses WHERE id IN ({placeholders})", chunk)
+        deleted += c.rowcount
+        c.executemany("""UPDATE expense_monthly_totals SET total = total - ?, count = count - ?
+                         WHERE month = ? AND description = ?""", groups)
+    c.execute("DELETE FROM expense_monthly_totals WHERE count <= 0")
+    bump_versions(c, 'expenses')
+    return deleted
+
+
+def add_expense(c, user_id, date, description, amount, spender):
+    add_expenses(c, [(user_id, date, description, amount, spender)])
+
+
+def remove_expense(c, expense_id):
+    remove_expenses(c, [expense_id])
+
+
+def rebuild_expense_rollup(c):
+    c.execute("DELETE FROM expense_monthly_totals")
+    c.execute("""INSERT INTO expense_monthly_totals (month, description, total, count)
+                 SELECT substr(date, 1, 7), description, SUM(amount), COUNT(*)
+                 FROM expenses GROUP BY substr(date, 1, 7), description""")
+
+
+# Serie del grafico spese: totali per periodo (bucket) e per tipo o persona.
+# Periodi dal più fine al più grossolano; il nome di ogni periodo è la data del suo inizio
+SERIES_BUCKETS = {
+    'day': "date",
+    'week': "date(date, 'weekday 0', '-6 days')",
+    'month': "substr(date, 1, 7)",
+    'year': "substr(date, 1, 4)",
+}
+SERIES_GROUPS = {'type': 'description', 'spender': 'spender'}
+# Punti massimi per serie: oltre, il periodo passa al successivo più grossolano; se
+# non basta nemmeno l'anno l'intervallo è troppo lungo
+MAX_SERIES_POINTS = 120
+
+
+def series_points(date_from, date_to, bucket):
+    # Numero di etichette di series_labels, senza costruirle
+    if bucket == 'day':
+        return (date_to - date_from).days + 1
+    if bucket == 'week':
+        return (date_to - date_from + timedelta(days=date_from.weekday())).days // 7 + 1
+    if bucket == 'month':
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    return date_to.year - date_from.year + 1
+
+
+def series_labels(date_from, date_to, bucket):
+    if bucket == 'day':
+        return [(date_from + timedelta(days=n)).isoformat() for n in range((date_to - date_from).days + 1)]
+    if bucket == 'week':
+        monday = date_from - timedelta(days=date_from.weekday())
+        return [(monday + timedelta(weeks=n)).isoformat() for n in range((date_to - monday).days // 7 + 1)]
+    months = [f'{year:04d}-{month:02d}' for year in range(date_from.year, date_to.year + 1) for month in range(1, 13)]
+    months = months[date_from.month - 1:len(months) - (12 - date_to.month)]
+    if bucket == 'month':
+        return months
+    # Come substr(date, 1, 4): quattro cifre anche prima dell'anno 1000
+    return [f'{year:04d}' for year in range(date_from.year, date_to.year + 1)]
+
+
+def series_bucket(date_from, date_to, bucket):
+    # Primo periodo, a partire da quello richiesto, con al massimo MAX_SERIES_POINTS
+    # punti; None se non ce n'è
+    buckets = list(SERIES_BUCKETS)
+    for candidate in buckets[buckets.index(bucket):]:
+        if series_points(date_from, date_to, candidate) <= MAX_SERIES_POINTS:
+            return candidate
+    return None
+
+
+def series_query(date_from, date_to, bucket, group):
+    # Restituisce (sql, parametri). Per mesi o anni interi raggruppati per tipo
+    # bastano le righe di expense_monthly_totals
+    whole_months = date_from.day == 1 and (date_to + timedelta(days=1)).day == 1
+    if group == 'type' and bucket in ('month', 'year') and whole_months:
+        period = "month" if bucket == 'month' else "substr(month, 1, 4)"
+        return (f"""SELECT {period}, description, SUM(total) FROM expense_monthly_totals
+                    WHERE month BETWEEN ? AND ? GROUP BY 1, 2""",
+                (date_from.isoformat()[:7], date_to.isoformat()[:7]))
+    return (f"""SELECT {SERIES_BUCKETS[bucket]}, {SERIES_GROUPS[group]}, SUM(amount) FROM expenses
+                WHERE date BETWEEN ? AND ? GROUP BY 1, 2""",
+            (date_from.isoformat(), date_to.isoformat()))
+
+
+def expense_series(c, date_from, date_to, bucket, group):
+    # Restituisce (etichette, {nome: totali allineati alle etichette})
+    c.execute(*series_query(date_from, date_to, bucket, group))
+    labels = series_labels(date_from, date_to, bucket)
+    positions = {label: index for index, label in enumerate(labels)}
+    series = {}
+    for label, name, total in c.fetchall():
+        # Date salvate in un altro formato (per esempio 2024-1-5) non cadono in nessun periodo
+        position = positions.get(label)
+        if position is not None:
+            series.setdefault(name, [0] * len(labels))[position] = round(total, 2)
+    return labels, dict(sorted(series.items()))